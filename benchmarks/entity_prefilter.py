@@ -0,0 +1,64 @@
+'''
+Compares replacing every entity with the full combined entity pattern against replacing them with the pattern of
+the entities whose prefilters pass, on a corpus of plain chat messages and on a corpus where most messages contain
+entities.
+
+    python benchmarks/entity_prefilter.py
+'''
+import os
+import random
+import sys
+import timeit
+
+# runs against the source checkout this script is in, whether or not textwrangler is installed
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from textwrangler.patterns import ENTITY_PATTERNS, compile_entity_pattern, find_entity_pattern
+
+ENTITIES = tuple(name for name, pattern in ENTITY_PATTERNS)
+
+WORDS = ('ok', 'see', 'you', 'later', 'that', 'was', 'so', 'funny', 'what', 'are', 'we', 'doing', 'tonight', 'lol',
+         'i', 'think', 'the', 'game', 'starts', 'soon', 'anyone', 'up', 'for', 'it', 'sure', 'sounds', 'good', 'to',
+         'me')
+
+ENTITY_SNIPPETS = ('https://example.com/a/b?c=1', 'www.example.org', 'bit.ly/x1y2', 'jane.doe@example.com',
+                   '(555) 123-4567', '@someone', '#weekend', '$20', '3.5', '1,000')
+
+
+def make_corpus(n_documents, entity_rate, seed=0):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(n_documents):
+        tokens = [rng.choice(WORDS) for _ in range(rng.randint(3, 20))]
+        if rng.random() < entity_rate:
+            for _ in range(rng.randint(1, 3)):
+                tokens.insert(rng.randint(0, len(tokens)), rng.choice(ENTITY_SNIPPETS))
+        corpus.append(' '.join(tokens))
+    return corpus
+
+
+def replace_unfiltered(corpus):
+    pattern = compile_entity_pattern(ENTITIES)
+    return [pattern.sub(lambda match: match.lastgroup, text) for text in corpus]
+
+
+def replace_prefiltered(corpus):
+    output = []
+    for text in corpus:
+        pattern = find_entity_pattern(text, ENTITIES)
+        output.append(text if pattern is None else pattern.sub(lambda match: match.lastgroup, text))
+    return output
+
+
+def main():
+    for name, entity_rate in (('clean', 0.0), ('mostly clean', 0.05), ('dirty', 0.8)):
+        corpus = make_corpus(20000, entity_rate)
+        assert replace_unfiltered(corpus) == replace_prefiltered(corpus)
+        unfiltered = min(timeit.repeat(lambda: replace_unfiltered(corpus), number=1, repeat=5))
+        prefiltered = min(timeit.repeat(lambda: replace_prefiltered(corpus), number=1, repeat=5))
+        print(f"{name:>12}: unfiltered {unfiltered * 1000:8.1f} ms, prefiltered {prefiltered * 1000:8.1f} ms "
+              f"({unfiltered / prefiltered:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
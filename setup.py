@@ -31,21 +31,23 @@ setup(
         'Development Status :: 3 - Alpha',
         'Intended Audience :: Developers',
         'Topic :: Text Processing',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
     ],
     packages=find_packages(),  # Required
-    python_requires='>=3.6',
+    python_requires='>=3.7',
     install_requires=['nltk',
                       'beautifulsoup4',
                       'better_profanity',
                       'contractions',
                       'langdetect',
+                      'pyphen',
                       'textblob',
-                      'textstat',
+                      'textstat==0.7.13',
                       'textsearch',
                       'inflect',
                       'unidecode',
+                      'numpy',
+                      'scipy',
                       'scikit-learn'
                       ],  # Optional
     setup_requires=['nltk'],
@@ -2,4 +2,8 @@ from textwrangler.extract import *
 from textwrangler.normalize import *
 from textwrangler.remove import *
 from textwrangler.replace import *
-from textwrangler.transform import *
\ No newline at end of file
+from textwrangler.transform import *
+from textwrangler.pipeline import *
+from textwrangler.language import LanguageIdentifier, LangDetectIdentifier, NGramProfileIdentifier
+from textwrangler.profanity import ProfanityMatcher
+from textwrangler.cache import FeatureCache, SQLiteFeatureCache
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Text
+
+# the number of documents looked up per query, below SQLite's default limit of 999 parameters
+_QUERY_SIZE = 500
+
+
+def document_hash(text: Text) -> bytes:
+    '''Returns the 16-byte BLAKE2b digest of the UTF-8 encoding of a string, which identifies it in a FeatureCache.'''
+    return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+class FeatureCache(object):
+    '''
+    Base class for the stores that TextFeatureExtractor(cache=...) keeps the results of its expensive features in, so
+    strings seen in an earlier run are looked up rather than recomputed.
+
+    A result is keyed by the hash of its string (see document_hash), the name of the feature, and a version string
+    identifying the configuration and code it was computed with, so changing either never returns stale results.
+    Results are dictionaries of JSON-serializable values. Subclasses implement get and set.
+    '''
+
+    def get(self, feature: Text, version: Text, documents):
+        '''Returns the stored result for each document hash in documents, or None for those that aren't stored.'''
+        raise NotImplementedError
+
+    def set(self, feature: Text, version: Text, documents, values):
+        '''Stores the result in values for each document hash in documents.'''
+        raise NotImplementedError
+
+
+class SQLiteFeatureCache(FeatureCache):
+    '''
+    A FeatureCache kept in an SQLite database file. The file can be shared by several processes, such as the workers
+    of TextFeatureExtractor(n_jobs=...), each of which opens its own connection. Once the stored results take up more
+    than max_size bytes, the least recently used ones are deleted.
+
+    Parameters
+    ----------
+
+    path :
+        The path of the database file. It is created if it doesn't exist.
+
+    max_size : default: 2 ** 30
+        The maximum size of the stored results in bytes. If None, no results are deleted.
+    '''
+
+    def __init__(self, path, max_size=2 ** 30):
+        self.path = path
+        self.max_size = max_size
+        self._connections = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        # an SQLite connection must not be used by the processes forked from the one that opened it, so each process
+        # opens its own. Inherited connections are kept, not closed, so they can't disturb the parent's.
+        pid = os.getpid()
+        connection = self._connections.get(pid)
+        if connection is None:
+            connection = sqlite3.connect(os.fspath(self.path), timeout=60)
+            connection.execute('PRAGMA journal_mode=WAL')
+            with connection:
+                connection.execute('CREATE TABLE IF NOT EXISTS features (document BLOB NOT NULL, '
+                                   'feature TEXT NOT NULL, version TEXT NOT NULL, value TEXT NOT NULL, '
+                                   'accessed REAL NOT NULL, PRIMARY KEY (document, feature, version))')
+                connection.execute('CREATE INDEX IF NOT EXISTS features_accessed ON features (accessed)')
+            self._connections[pid] = connection
+
+        return connection
+
+    def get(self, feature: Text, version: Text, documents):
+        connection = self._connect()
+        found = {}
+        for start in range(0, len(documents), _QUERY_SIZE):
+            query = documents[start:start + _QUERY_SIZE]
+            found.update(connection.execute(
+                'SELECT document, value FROM features WHERE feature = ? AND version = ? AND document IN '
+                f'({",".join("?" * len(query))})', (feature, version, *query)))
+
+        if found:
+            accessed = time.time()
+            with connection:
+                connection.executemany('UPDATE features SET accessed = ? '
+                                       'WHERE document = ? AND feature = ? AND version = ?',
+                                       [(accessed, document, feature, version) for document in found])
+
+        return [json.loads(found[document]) if document in found else None for document in documents]
+
+    def set(self, feature: Text, version: Text, documents, values):
+        connection = self._connect()
+        accessed = time.time()
+        with connection:
+            connection.executemany('INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?, ?)',
+                                   [(document, feature, version, json.dumps(value), accessed)
+                                    for document, value in zip(documents, values)])
+            self._evict(connection)
+
+    def _evict(self, connection: sqlite3.Connection):
+        if self.max_size is None:
+            return
+
+        page_size, = connection.execute('PRAGMA page_size').fetchone()
+        page_count, = connection.execute('PRAGMA page_count').fetchone()
+        free_pages, = connection.execute('PRAGMA freelist_count').fetchone()
+        size = (page_count - free_pages) * page_size
+        if size <= self.max_size:
+            return
+
+        # the least recently used results are deleted in proportion to the excess, down to 90% of max_size so that
+        # eviction doesn't run again on every write
+        count, = connection.execute('SELECT COUNT(*) FROM features').fetchone()
+        excess = int(count * (1 - 0.9 * self.max_size / size)) + 1
+        connection.execute('DELETE FROM features WHERE rowid IN '
+                           '(SELECT rowid FROM features ORDER BY accessed LIMIT ?)', (excess,))
+
+    def close(self):
+        '''Closes this process's connection to the database. It is reopened when the cache is next used.'''
+        connection = self._connections.pop(os.getpid(), None)
+        if connection is not None:
+            connection.close()
+
+    def __getstate__(self):
+        # connections can't be copied; a copy opens its own
+        state = self.__dict__.copy()
+        state['_connections'] = {}
+        return state
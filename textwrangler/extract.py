@@ -1,15 +1,194 @@
 # -*- coding: utf-8 -*-
 from typing import Text, Dict
-from nltk.corpus import stopwords
-import textstat
 import string
-from langdetect import detect, detect_langs
 from textblob import TextBlob
 from sklearn.base import BaseEstimator, TransformerMixin
-from better_profanity import profanity
+from .cache import FeatureCache, SQLiteFeatureCache, document_hash
+from .language import get_language_identifier
+from .patterns import find_entity_pattern
+from .profanity import get_profanity_matcher
+from .readability import READABILITY_SCORES, readability_scores, syllable_source
+from .replace import _ENTITY_PARAMETERS
+from .sentiment import lexicon_sentiment
+from .stop_words import get_stop_words
+from .utils import _StreamingMixin, _batches, _scatter, _unique
 import multiprocessing as mp
+from collections import deque
+import numpy as np
 import traceback
 
+# (parameter, extraction method, output columns) in the order the features are returned. The features without a
+# method are always computed for a whole batch at once by _precompute. The language columns depend on the languages
+# detected, so in array output they cover every language the language backend supports.
+_FEATURES = (
+    ('token_count', None, ('token_count',)),
+    ('string_length', None, ('string_length',)),
+    ('average_token_size', '_extract_average_token_size', ('average_token_size',)),
+    ('stop_word_count', '_extract_stop_word_count', ('stop_word_count',)),
+    ('numerical_token_count', '_extract_numerical_token_count', ('numerical_token_count',)),
+    ('upper_token_count', '_extract_upper_token_count', ('upper_token_count',)),
+    ('title_token_count', '_extract_title_token_count', ('title_token_count',)),
+    ('readability_scores', '_extract_readability_scores', READABILITY_SCORES),
+    ('language', None, None),
+    ('polarity', '_extract_polarity', ('polarity',)),
+    ('subjectivity', '_extract_subjectivity', ('subjectivity',)),
+    ('exclamation_mark_count', None, ('exclamation_mark_count',)),
+    ('question_mark_count', None, ('question_mark_count',)),
+    ('number_of_unique_tokens', '_extract_number_of_unique_tokens', ('number_of_unique_tokens',)),
+    ('unique_token_proportion', '_extract_unique_token_proportion', ('unique_token_proportion',)),
+    ('title_token_proportion', '_extract_title_token_proportion', ('title_token_proportion',)),
+    ('upper_token_proportion', '_extract_upper_token_proportion', ('upper_token_proportion',)),
+    ('numerical_token_proportion', '_extract_numerical_token_proportion', ('numerical_token_proportion',)),
+    ('stop_word_proportion', '_extract_stop_word_proportion', ('stop_word_proportion',)),
+    ('punctuation_character_count', None, ('punctuation_character_count',)),
+    ('punctuation_proportion', None, ('punctuation_character_proportion',)),
+    ('contains_profanity', '_extract_profanity_check', ('contains_profanity',)),
+    ('profanity_count', '_extract_profanity_count', ('profanity_count',)),
+)
+
+# The version of each feature kept in a FeatureCache, part of the key its results are stored under. Bump it whenever
+# the feature's output changes, so results computed by earlier code are no longer used.
+_CACHED_FEATURE_VERSIONS = {
+    'readability_scores': 1,
+    'language': 1,
+    'sentiment': 1,
+}
+
+
+# Features computed for a whole batch at once by _count_characters instead of per string.
+_COUNTED_FEATURES = frozenset(['token_count', 'string_length', 'exclamation_mark_count', 'question_mark_count',
+                               'punctuation_character_count', 'punctuation_proportion'])
+
+_WHITESPACE, _PUNCTUATION, _EXCLAMATION_MARK, _QUESTION_MARK = 1, 2, 4, 8
+
+# Bit flags for every code point up to the last one str.isspace() accepts (U+3000). All higher code points are
+# clipped onto the final entry, which has no flags set.
+_CHARACTER_CLASSES = np.zeros(0x3002, dtype=np.uint8)
+_CHARACTER_CLASSES[[c for c in range(0x3001) if chr(c).isspace()]] |= _WHITESPACE
+_CHARACTER_CLASSES[[ord(c) for c in string.punctuation]] |= _PUNCTUATION
+_CHARACTER_CLASSES[ord('!')] |= _EXCLAMATION_MARK
+_CHARACTER_CLASSES[ord('?')] |= _QUESTION_MARK
+
+# Limits the size of the encoded buffer built by _count_characters (4 bytes per character).
+_COUNTER_BLOCK_SIZE = 10000
+
+
+def _count_characters(items):
+    '''
+    Computes the counter features for a list of strings with NumPy operations over a UTF-32 buffer of the
+    concatenated strings, instead of a Python loop per string. The counts agree with str.split(), so token_count
+    and string_length match those of _TextAnalysis exactly.
+
+    Returns a dictionary mapping each feature in _COUNTED_FEATURES to an array with a value for each string.
+    '''
+    blocks = []
+    for start in range(0, len(items), _COUNTER_BLOCK_SIZE):
+        block = items[start:start + _COUNTER_BLOCK_SIZE]
+        lengths = np.fromiter((len(item) for item in block), dtype=np.int64, count=len(block))
+        boundaries = np.concatenate(([0], np.cumsum(lengths)))
+        codes = np.frombuffer(''.join(block).encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+        classes = _CHARACTER_CLASSES[np.minimum(codes, _CHARACTER_CLASSES.size - 1)]
+
+        def per_string(mask):
+            cumulative = np.concatenate(([0], np.cumsum(mask, dtype=np.int64)))
+            return cumulative[boundaries[1:]] - cumulative[boundaries[:-1]]
+
+        # a token starts at each non-whitespace character that follows whitespace or begins a string
+        non_whitespace = (classes & _WHITESPACE) == 0
+        token_starts = non_whitespace.copy()
+        token_starts[1:] &= ~non_whitespace[:-1]
+        first_characters = boundaries[:-1][lengths > 0]
+        token_starts[first_characters] = non_whitespace[first_characters]
+
+        blocks.append({
+            'token_count': per_string(token_starts),
+            'string_length': per_string(non_whitespace),
+            'exclamation_mark_count': per_string((classes & _EXCLAMATION_MARK) != 0),
+            'question_mark_count': per_string((classes & _QUESTION_MARK) != 0),
+            'punctuation_character_count': per_string((classes & _PUNCTUATION) != 0),
+        })
+
+    output = {feature: np.concatenate([block[feature] for block in blocks]) if blocks else np.zeros(0, dtype=np.int64)
+              for feature in _COUNTED_FEATURES if feature != 'punctuation_proportion'}
+    punctuation, length = output['punctuation_character_count'], output['string_length']
+    output['punctuation_proportion'] = np.divide(punctuation, length, out=np.zeros(len(items)),
+                                                 where=(punctuation > 0) & (length > 0))
+    return output
+
+
+class _TextAnalysis(object):
+    '''
+    Splits a string into tokens once and derives the token and character counts used by the
+    TextFeatureExtractor features, so enabling several features doesn't re-tokenize the same string.
+
+    The token flag counts are computed together in a single pass over the tokens the first time
+    any of them is requested.
+    '''
+
+    __slots__ = ('text', 'tokens', '_token_counts', '_unique_token_count', '_stop_word_count', '_sentiment')
+
+    def __init__(self, text: Text):
+        self.text = text
+        self.tokens = text.split()
+        self._token_counts = None
+        self._unique_token_count = None
+        self._stop_word_count = None
+        self._sentiment = None
+
+    def _count_tokens(self):
+        string_length = numerical_token_count = upper_token_count = title_token_count = 0
+        for token in self.tokens:
+            string_length += len(token)
+            if token.isdigit():
+                numerical_token_count += 1
+            if token.isupper():
+                upper_token_count += 1
+            if token.istitle():
+                title_token_count += 1
+
+        self._token_counts = (string_length, numerical_token_count, upper_token_count, title_token_count)
+        return self._token_counts
+
+    @property
+    def token_count(self) -> int:
+        return len(self.tokens)
+
+    @property
+    def string_length(self) -> int:
+        '''The number of characters in the string, excluding white space.'''
+        return (self._token_counts or self._count_tokens())[0]
+
+    @property
+    def numerical_token_count(self) -> int:
+        return (self._token_counts or self._count_tokens())[1]
+
+    @property
+    def upper_token_count(self) -> int:
+        return (self._token_counts or self._count_tokens())[2]
+
+    @property
+    def title_token_count(self) -> int:
+        return (self._token_counts or self._count_tokens())[3]
+
+    @property
+    def unique_token_count(self) -> int:
+        if self._unique_token_count is None:
+            self._unique_token_count = len(set(self.tokens))
+        return self._unique_token_count
+
+    @property
+    def sentiment(self):
+        '''TextBlob's (polarity, subjectivity) sentiment, computed once for both features.'''
+        if self._sentiment is None:
+            self._sentiment = TextBlob(self.text).sentiment
+        return self._sentiment
+
+    def count_stop_words(self, stop_words: frozenset) -> int:
+        if self._stop_word_count is None:
+            self._stop_word_count = sum(1 for token in self.tokens if token in stop_words)
+        return self._stop_word_count
+
+
 class TextFeatureExtractor(BaseEstimator, TransformerMixin):
     '''
     Parameters
@@ -18,19 +197,50 @@ class TextFeatureExtractor(BaseEstimator, TransformerMixin):
     average_token_size : default: False
         If True, returns the mean character length of the tokens in the string.
 
+    cache : default: None
+        A FeatureCache, or the path of an SQLite database file to use as an SQLiteFeatureCache, that the results of the
+        expensive features (readability_scores, language and the TextBlob polarity and subjectivity) are kept in
+        between runs. Each batch looks its strings up in the cache and only computes the features of those it
+        doesn't hold. Results are stored per string, feature and configuration, so changing language_backend, for
+        example, doesn't return results computed with the old one. Language results from a LanguageIdentifier
+        instance are not cached. When n_jobs is greater than 1, each worker process gets its own copy of a FeatureCache
+        instance, so a cache held in memory isn't shared with the workers: they don't see its results, and the results
+        they compute never reach it. An SQLiteFeatureCache is shared through its database file.
+
+    chunksize : default: None
+        The number of strings sent to a worker process at a time when n_jobs is greater than 1. If None, each call to
+        transform is split into roughly four chunks per worker.
+
     contains_profanity : default: False
-        If True, checks for profanity in the string using the better-profanity library.
+        If True, checks for profanity in the string, using the wordlist and leetspeak variants of the better-profanity
+        library compiled into a ProfanityMatcher. The check stops at the first match.
 
         See https://github.com/snguyenthanh/better_profanity.
 
+    dedupe : default: False
+        If True, the features of each distinct string of a batch are computed once, and only the distinct strings are
+        sent to the worker processes. The results are then copied to the duplicates in their original positions.
+
     exclamation_mark_count : default: False
         If True, counts the number of exclamation marks in the string.
 
+    extra_stop_words : default: None
+        A list of words to count as stop words in addition to those of stop_word_languages.
+
     language : default: False
-        If True, detects the language of the string using the langdetect library, a port of the Google
-        language-detection library. Note that by default it is set to False because it is slow to compute.
+        If True, returns the probability of each language detected in the string, as 'lang_<code>' features. Note that
+        by default it is set to False because it is slow to compute.
+
+    language_backend : default: 'langdetect'
+        The language identifier used by language. One of:
+
+        * 'langdetect': the langdetect library, a port of the Google language-detection library, seeded so the
+          output is deterministic. See https://github.com/Mimino666/langdetect.
+        * 'ngram': a compact character n-gram model built from langdetect's language profiles, which scores a whole
+          batch at once with matrix operations. Much faster, and accurate on all but very short strings.
+        * a LanguageIdentifier instance.
 
-        See https://github.com/Mimino666/langdetect.
+        Both built-in backends cache their results for short strings, so repeated messages are only identified once.
 
     number_of_unique_tokens : default: False
         If True, counts the number of unique tokens in the string.
@@ -42,7 +252,14 @@ class TextFeatureExtractor(BaseEstimator, TransformerMixin):
         If True, calculates the proportion of all tokens in the string that are numbers.
 
     n_jobs : default: 1
-        The number of cores to use when processing.
+        The number of cores to use when processing. The worker processes are started on the first call to transform
+        and reused by later calls until close() is called, or until the end of a `with` block if the extractor is used
+        as a context manager.
+
+    output : default: 'dict'
+        If 'dict', transform returns a list with a dictionary of features for each string.
+        If 'array', transform returns a 2-D float64 NumPy array with a row for each string and a column for each
+        feature, in the order given by get_feature_names_out().
 
     polarity : default: False
         If True, returns the polarity score calculated with TextBlob sentiment analysis. The polarity score is a
@@ -50,6 +267,9 @@ class TextFeatureExtractor(BaseEstimator, TransformerMixin):
 
         See https://textblob.readthedocs.io/en/dev/quickstart.html#sentiment-analysis.
 
+    profanity_count : default: False
+        If True, counts the number of profane words and phrases in the string (see contains_profanity).
+
     punctuation_character_count : default: False
         If True, returns the number of punctuation characters in the string.
 
@@ -60,13 +280,25 @@ class TextFeatureExtractor(BaseEstimator, TransformerMixin):
         If True, counts the number of question marks in the string.
 
     readability_scores : default: False
-        If True, returns a set of readability scores as calculated by the textstat library.
+        If True, returns a set of readability scores: the Flesch reading ease, SMOG index, Flesch-Kincaid grade,
+        Coleman-Liau index, automated readability index, Dale-Chall score, number of difficult words, Linsear Write
+        formula, Gunning fog index and the consensus text standard. The scores follow textstat 0.7.13, but are all
+        derived from a single count of the sentences, words and syllables of the string.
 
         See https://github.com/shivam5992/textstat.
 
+    sentiment_backend : default: 'textblob'
+        How polarity and subjectivity are computed. If 'textblob', TextBlob's sentiment analyzer is run once per string
+        and fills both features. If 'lexicon', each string is scored as the mean polarity and subjectivity of its words
+        in the TextBlob sentiment lexicon, computed for a whole batch at once. This is much faster, but ignores
+        negations and intensifiers.
+
     stop_word_count : default: False
         If True, returns the number of tokens that are stop words.
 
+    stop_word_languages : default: 'english'
+        The NLTK stop word list, or a list of them, used by stop_word_count and stop_word_proportion.
+
     stop_word_proportion : default: False
         If True, returns the proportion of all the tokens in the string that are stop words.
 
@@ -106,14 +338,21 @@ class TextFeatureExtractor(BaseEstimator, TransformerMixin):
 
     '''
 
-    def __init__(self, average_token_size=False, contains_profanity=False, exclamation_mark_count=False, language=False,
+    def __init__(self, average_token_size=False, cache=None, chunksize=None, contains_profanity=False, dedupe=False,
+                 exclamation_mark_count=False, extra_stop_words=None, language=False, language_backend='langdetect',
                  number_of_unique_tokens=False, numerical_token_count=False, numerical_token_proportion=False, n_jobs=1,
-                 polarity=False, punctuation_character_count=False, punctuation_proportion=False, question_mark_count=False,
-                 readability_scores=False, stop_word_count=False, stop_word_proportion=False, string_length=False,
-                 subjectivity=False, title_token_count=False, title_token_proportion=False, token_count=False,
-                 upper_token_count=False, upper_token_proportion=False, unique_token_proportion=False):
+                 output='dict', polarity=False, profanity_count=False, punctuation_character_count=False,
+                 punctuation_proportion=False, question_mark_count=False, readability_scores=False,
+                 sentiment_backend='textblob', stop_word_count=False, stop_word_languages='english',
+                 stop_word_proportion=False, string_length=False, subjectivity=False, title_token_count=False,
+                 title_token_proportion=False, token_count=False, upper_token_count=False, upper_token_proportion=False,
+                 unique_token_proportion=False):
 
         self.n_jobs = n_jobs
+        self.cache = cache
+        self.chunksize = chunksize
+        self.dedupe = dedupe
+        self.output = output
         self.token_count = token_count
         self.string_length = string_length
         self.average_token_size = average_token_size
@@ -122,247 +361,529 @@ class TextFeatureExtractor(BaseEstimator, TransformerMixin):
         self.upper_token_count = upper_token_count
         self.readability_scores = readability_scores
         self.language = language
+        self.language_backend = language_backend
         self.polarity = polarity
         self.subjectivity = subjectivity
+        self.sentiment_backend = sentiment_backend
         self.title_token_count = title_token_count
         self.exclamation_mark_count = exclamation_mark_count
         self.question_mark_count = question_mark_count
         self.number_of_unique_tokens = number_of_unique_tokens
         self.unique_token_proportion = unique_token_proportion
         self.stop_word_proportion = stop_word_proportion
+        self.stop_word_languages = stop_word_languages
+        self.extra_stop_words = extra_stop_words
         self.numerical_token_proportion = numerical_token_proportion
         self.title_token_proportion = title_token_proportion
         self.upper_token_proportion = upper_token_proportion
         self.punctuation_character_count = punctuation_character_count
         self.punctuation_proportion = punctuation_proportion
         self.contains_profanity = contains_profanity
+        self.profanity_count = profanity_count
 
-    def _extract_profanity_check(self, text: Text) -> Dict:
-        return {'contains_profanity': int(profanity.contains_profanity(text))}
-
-    def _extract_token_count(self, text: Text) -> Dict:
-        return {'token_count': len(text.split())}
+    def _extract_profanity_check(self, doc: _TextAnalysis) -> Dict:
+        return {'contains_profanity': int(get_profanity_matcher().contains(doc.text))}
 
-    def _extract_punctuation_character_count(self, text: Text) -> Dict:
-        return {'punctuation_character_count': len([c for c in text if c in string.punctuation])}
+    def _extract_profanity_count(self, doc: _TextAnalysis) -> Dict:
+        return {'profanity_count': get_profanity_matcher().count(doc.text)}
 
-    def _extract_string_length(self, text: Text, exclude_whitespace=True) -> Dict:
-        if exclude_whitespace == True:
-            return {'string_length': len(''.join(text.split()))}
+    def _extract_average_token_size(self, doc: _TextAnalysis) -> Dict:
+        if doc.token_count == 0:
+            return {'average_token_size': 0}
         else:
-            return {'string_length': len(text)}
+            return {'average_token_size': doc.string_length / doc.token_count}
 
-    def _extract_average_token_size(self, text: Text) -> Dict:
-      tokens = text.split()
-      if len(tokens) == 0:
-          return {'average_token_size': 0}
-      else:
-          return {'average_token_size': sum(len(token) for token in tokens)/len(tokens)}
+    def _extract_stop_word_count(self, doc: _TextAnalysis) -> Dict:
+        stop_words = get_stop_words(self.stop_word_languages, self.extra_stop_words)
+        return {'stop_word_count': doc.count_stop_words(stop_words)}
 
-    def _extract_stop_word_count(self, text: Text) -> Dict:
-        return {'stop_word_count': len([token for token in text.split() if token in stopwords.words('english')])}
+    def _extract_numerical_token_count(self, doc: _TextAnalysis) -> Dict:
+        return {'numerical_token_count': doc.numerical_token_count}
 
-    def _extract_numerical_token_count(self, text: Text) -> Dict:
-        return {'numerical_token_count': len([token for token in text.split() if token.isdigit()])}
+    def _extract_upper_token_count(self, doc: _TextAnalysis) -> Dict:
+        return {'upper_token_count': doc.upper_token_count}
 
-    def _extract_upper_token_count(self, text: Text) -> Dict:
-        return {'upper_token_count': len([token for token in text.split() if token.isupper()])}
+    def _extract_number_of_unique_tokens(self, doc: _TextAnalysis) -> Dict:
+        return {'number_of_unique_tokens': doc.unique_token_count}
 
-    def _extract_exclamation_mark_count(self, text: Text) -> Dict:
-        return {'exclamation_mark_count': text.count('!')}
-
-    def _extract_question_mark_count(self, text: Text) -> Dict:
-        return {'question_mark_count': text.count('?')}
-
-    def _extract_number_of_unique_tokens(self, text: Text) -> Dict:
-        return {'number_of_unique_tokens': len(set(w for w in text.split()))}
-
-    def _extract_unique_token_proportion(self, text: Text) -> Dict:
-        number_of_unique_tokens = self._extract_number_of_unique_tokens(text)['number_of_unique_tokens']
-        token_count = self._extract_token_count(text)['token_count']
-        if number_of_unique_tokens == 0 or token_count == 0:
+    def _extract_unique_token_proportion(self, doc: _TextAnalysis) -> Dict:
+        if doc.unique_token_count == 0 or doc.token_count == 0:
             return {'unique_token_proportion': 0}
         else:
-            return {'unique_token_proportion': float(number_of_unique_tokens / token_count)}
+            return {'unique_token_proportion': float(doc.unique_token_count / doc.token_count)}
 
-    def _extract_title_token_count(self, text: Text) -> Dict:
-        return {'title_token_count': len([token for token in text.split() if token.istitle()])}
+    def _extract_title_token_count(self, doc: _TextAnalysis) -> Dict:
+        return {'title_token_count': doc.title_token_count}
 
-    def _extract_polarity(self, text: Text) -> Dict:
-        return {'polarity': TextBlob(text).sentiment.polarity}
+    def _extract_polarity(self, doc: _TextAnalysis) -> Dict:
+        return {'polarity': doc.sentiment.polarity}
 
-    def _extract_subjectivity(self, text: Text) -> Dict:
-        return {'subjectivity': TextBlob(text).sentiment.subjectivity}
+    def _extract_subjectivity(self, doc: _TextAnalysis) -> Dict:
+        return {'subjectivity': doc.sentiment.subjectivity}
 
-    def _extract_stop_word_proportion(self, text: Text) -> Dict:
-        token_count = self._extract_token_count(text)['token_count']
-        stop_word_count = self._extract_stop_word_count(text)['stop_word_count']
-        if stop_word_count == 0 or token_count == 0:
+    def _extract_stop_word_proportion(self, doc: _TextAnalysis) -> Dict:
+        stop_word_count = self._extract_stop_word_count(doc)['stop_word_count']
+        if stop_word_count == 0 or doc.token_count == 0:
             return {'stop_word_proportion': 0}
         else:
-            return {'stop_word_proportion': float(stop_word_count / token_count)}
+            return {'stop_word_proportion': float(stop_word_count / doc.token_count)}
 
-    def _extract_numerical_token_proportion(self, text: Text) -> Dict:
-        token_count = self._extract_token_count(text)['token_count']
-        numerical_token_count = self._extract_numerical_token_count(text)['numerical_token_count']
-        if numerical_token_count == 0 or token_count == 0:
+    def _extract_numerical_token_proportion(self, doc: _TextAnalysis) -> Dict:
+        if doc.numerical_token_count == 0 or doc.token_count == 0:
             return {'numerical_token_proportion': 0}
         else:
-            return {'numerical_token_proportion': float(numerical_token_count / token_count)}
+            return {'numerical_token_proportion': float(doc.numerical_token_count / doc.token_count)}
 
-    def _extract_upper_token_proportion(self, text: Text) -> Dict:
-        token_count = self._extract_token_count(text)['token_count']
-        upper_token_count = self._extract_upper_token_count(text)['upper_token_count']
-        if upper_token_count == 0 or token_count == 0:
+    def _extract_upper_token_proportion(self, doc: _TextAnalysis) -> Dict:
+        if doc.upper_token_count == 0 or doc.token_count == 0:
             return {'upper_token_proportion': 0}
         else:
-            return {'upper_token_proportion': float(upper_token_count / token_count)}
+            return {'upper_token_proportion': float(doc.upper_token_count / doc.token_count)}
 
-    def _extract_title_token_proportion(self, text: Text) -> Dict:
-        token_count = self._extract_token_count(text)['token_count']
-        title_token_count = self._extract_title_token_count(text)['title_token_count']
-        if title_token_count == 0 or token_count == 0:
+    def _extract_title_token_proportion(self, doc: _TextAnalysis) -> Dict:
+        if doc.title_token_count == 0 or doc.token_count == 0:
             return {'title_token_proportion': 0}
         else:
-            return {'title_token_proportion': float(title_token_count/token_count)}
+            return {'title_token_proportion': float(doc.title_token_count / doc.token_count)}
 
-    def _extract_punctuation_proportion(self, text: Text) -> Dict:
-        string_length = self._extract_string_length(text, exclude_whitespace=True)['string_length']
-        punctuation_character_count = self._extract_punctuation_character_count(text)['punctuation_character_count']
-        if punctuation_character_count == 0 or string_length == 0:
-            return {'punctuation_character_proportion': 0}
-        else:
-            return {'punctuation_character_proportion': float(punctuation_character_count/string_length)}
+    def _extract_readability_scores(self, doc: _TextAnalysis, scores=None) -> Dict:
+        return readability_scores(doc.text, scores)
+
+    def _get_language_identifier(self):
+        if getattr(self, '_language_identifier_backend', None) is not self.language_backend:
+            self._language_identifier = get_language_identifier(self.language_backend)
+            self._language_identifier_backend = self.language_backend
 
-    def _extract_readability_scores(self, text: Text, scores=None) -> Dict:
+        return self._language_identifier
 
-        output = {}
-        if scores == None or 'flesch_reading_ease' in scores:
-            output['flesch_reading_ease'] = textstat.flesch_reading_ease(text)
+    def _detect_languages(self, items):
+        return [{f'lang_{lang}': probability for lang, probability in probabilities.items()}
+                for probabilities in self._get_language_identifier().predict_proba(items)]
 
-        if scores == None or 'smog_index' in scores:
-            output['smog_index'] = textstat.smog_index(text)
+    def fit(self, X, y=None):
+        return self
+
+    def _get_features(self):
+        return [feature for feature in _FEATURES if getattr(self, feature[0]) == True]
 
-        if scores == None or 'flesch_kincaid_grade' in scores:
-            output['flesch_kincaid_grade'] = textstat.flesch_kincaid_grade(text)
+    def get_feature_names_out(self, input_features=None):
+        '''
+        Returns the names of the columns of the array returned by transform when output='array'.
+        '''
+        names = []
+        for parameter, method, columns in self._get_features():
+            if columns is None:
+                columns = [f'lang_{lang}' for lang in self._get_language_identifier().languages]
+            names.extend(columns)
 
-        if scores == None or 'coleman_liau_index' in scores:
-            output['coleman_liau_index'] = textstat.coleman_liau_index(text)
+        return np.asarray(names, dtype=object)
+
+    def _process_item(self, item, features=None, precomputed=None):
+        try:
+            if features is None:
+                features = self._get_features()
 
-        if scores == None or 'automated_readability_index' in scores:
-            output['automated_readability_index'] = textstat.automated_readability_index(text)
+            doc = None
+            output = {}
+            for parameter, method, columns in features:
+                if precomputed is not None and parameter in precomputed:
+                    if columns is None or len(columns) > 1:
+                        output.update(precomputed[parameter])
+                    else:
+                        output[columns[0]] = precomputed[parameter]
+                else:
+                    if doc is None:
+                        doc = _TextAnalysis(item)
+                    output.update(getattr(self, method)(doc))
 
-        if scores == None or 'dale_chall_readability_score' in scores:
-            output['dale_chall_readability_score'] = textstat.dale_chall_readability_score(text)
+            return output
 
-        if scores == None or 'difficult_words' in scores:
-            output['difficult_words'] = textstat.difficult_words(text)
+        except Exception as e:
+            print('Caught exception in worker thread (item: \n{}):'.format(item))
+            traceback.print_exc()
+            print()
+            raise e
 
-        if scores == None or 'linsear_write_formula' in scores:
-            output['linsear_write_formula'] = textstat.linsear_write_formula(text)
+    def _precompute(self, items, features):
+        '''
+        Computes the features that are calculated for a whole batch at once rather than per string. Returns a
+        dictionary mapping each such enabled parameter to a sequence with a value for each string.
+        '''
+        enabled = set(parameter for parameter, method, columns in features)
+        precomputed = {}
+        if enabled & _COUNTED_FEATURES:
+            precomputed.update((parameter, values) for parameter, values in _count_characters(items).items()
+                               if parameter in enabled)
+
+        if self.sentiment_backend == 'lexicon' and enabled & {'polarity', 'subjectivity'}:
+            polarity, subjectivity = lexicon_sentiment(items)
+            precomputed.update((parameter, values) for parameter, values in
+                               (('polarity', polarity), ('subjectivity', subjectivity)) if parameter in enabled)
+
+        if 'language' in enabled:
+            # a list with a dictionary of language columns for each string
+            precomputed['language'] = self._cached('language', items, self._detect_languages)
+
+        if self._get_cache() is not None:
+            if 'readability_scores' in enabled:
+                precomputed['readability_scores'] = self._cached(
+                    'readability_scores', items, lambda items: [readability_scores(item) for item in items])
+
+            if self.sentiment_backend == 'textblob' and enabled & {'polarity', 'subjectivity'}:
+                sentiments = self._cached('sentiment', items, self._textblob_sentiments)
+                precomputed.update((parameter, [sentiment[parameter] for sentiment in sentiments])
+                                   for parameter in ('polarity', 'subjectivity') if parameter in enabled)
+
+        return precomputed
+
+    def _textblob_sentiments(self, items):
+        return [{'polarity': sentiment.polarity, 'subjectivity': sentiment.subjectivity}
+                for sentiment in (TextBlob(item).sentiment for item in items)]
+
+    def _get_cache(self):
+        if self.cache is None or isinstance(self.cache, FeatureCache):
+            return self.cache
+
+        if getattr(self, '_feature_cache_path', None) != self.cache:
+            self._feature_cache = SQLiteFeatureCache(self.cache)
+            self._feature_cache_path = self.cache
+
+        return self._feature_cache
+
+    def _get_cache_version(self, feature):
+        # the configuration a cached feature depends on, or None if it can't be identified
+        if feature == 'language':
+            if not isinstance(self.language_backend, str):
+                return None
+            return f'{_CACHED_FEATURE_VERSIONS[feature]}:{self.language_backend}'
+
+        if feature == 'sentiment':
+            return f'{_CACHED_FEATURE_VERSIONS[feature]}:{self.sentiment_backend}'
+
+        if feature == 'readability_scores':
+            # the syllable counts come from cmudict or pyphen depending on what is installed
+            return f'{_CACHED_FEATURE_VERSIONS[feature]}:{syllable_source()}'
+
+        return str(_CACHED_FEATURE_VERSIONS[feature])
+
+    def _cached(self, feature, items, compute):
+        '''
+        Returns compute(items), a list with a dictionary of results for each string, taking the results of the strings
+        held in the feature cache from it and computing and storing the rest.
+        '''
+        cache = self._get_cache()
+        version = self._get_cache_version(feature) if cache is not None else None
+        if version is None:
+            return compute(items)
+
+        documents = [document_hash(item) for item in items]
+        output = cache.get(feature, version, documents)
+        missing = [i for i, values in enumerate(output) if values is None]
+        if missing:
+            computed = compute([items[i] for i in missing])
+            for i, values in zip(missing, computed):
+                output[i] = values
+            cache.set(feature, version, [documents[i] for i in missing], computed)
 
-        if scores == None or 'gunning_fog' in scores:
-            output['gunning_fog'] = textstat.gunning_fog(text)
+        return output
 
-        if scores == None or 'text_standard' in scores:
-            output['text_standard'] = textstat.text_standard(text, float_output=True)
+    def _process_batch(self, items):
+        features = self._get_features()
+        precomputed = self._precompute(items, features)
+
+        if self.output == 'dict':
+            precomputed = {parameter: values.tolist() if isinstance(values, np.ndarray) else values
+                           for parameter, values in precomputed.items()}
+            if 'punctuation_proportion' in precomputed:
+                precomputed['punctuation_proportion'] = [value or 0 for value in precomputed['punctuation_proportion']]
+
+            return [self._process_item(item, features,
+                                       {parameter: values[i] for parameter, values in precomputed.items()})
+                    for i, item in enumerate(items)]
+
+        column_index = {name: j for j, name in enumerate(self.get_feature_names_out())}
+        output = np.zeros((len(items), len(column_index)), dtype=np.float64)
+        for parameter, method, columns in features:
+            if parameter not in precomputed:
+                continue
+
+            if columns is None or len(columns) > 1:
+                for i, values in enumerate(precomputed[parameter]):
+                    for name, value in values.items():
+                        j = column_index.get(name)
+                        if j is not None:
+                            output[i, j] = value
+            else:
+                output[:, column_index[columns[0]]] = precomputed[parameter]
+
+        features = [feature for feature in features if feature[0] not in precomputed]
+        if features:
+            for i, item in enumerate(items):
+                for name, value in self._process_item(item, features).items():
+                    j = column_index.get(name)
+                    if j is not None:
+                        output[i, j] = value
 
         return output
 
-    def _extract_language(self, text: Text, output_probabilities=True) -> Dict:
-        if output_probabilities == False:
-            return {'lang': detect(text)}
-        else:
-            return {f'lang_{item.lang}': item.prob for item in detect_langs(text)}
+    def _get_pool(self):
+        params = self.get_params()
+        if getattr(self, '_pool', None) is not None and self._pool_params != params:
+            # the workers were started with a different feature configuration
+            self.close()
 
-    def fit(self, X, y=None):
+        if getattr(self, '_pool', None) is None:
+            self._pool = mp.Pool(processes=self.n_jobs, initializer=_init_worker, initargs=(params,))
+            self._pool_params = params
+
+        return self._pool
+
+    def _chunks(self, text):
+        chunksize = self.chunksize
+        if chunksize is None:
+            chunksize = max(1, -(-len(text) // (self.n_jobs * 4)))
+
+        return [text[i:i + chunksize] for i in range(0, len(text), chunksize)]
+
+    def close(self):
+        '''
+        Shuts down the worker processes started by transform. A later call to transform starts a new pool.
+        '''
+        pool = getattr(self, '_pool', None)
+        self._pool = None
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    def __enter__(self):
         return self
 
-    def _process_item(self, item):
-        try:
-            output = {}
-            if self.token_count == True:
-                output = {**output, **self._extract_token_count(item)}
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def __del__(self):
+        pool = getattr(self, '_pool', None)
+        if pool is not None:
+            pool.terminate()
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.pop('_pool', None)
+        state.pop('_pool_params', None)
+        state.pop('_language_identifier', None)
+        state.pop('_language_identifier_backend', None)
+        state.pop('_feature_cache', None)
+        state.pop('_feature_cache_path', None)
+        return state
+
+    def _check_parameters(self):
+        if self.output not in ('dict', 'array'):
+            raise ValueError(f"output must be 'dict' or 'array', got {self.output!r}")
+
+        if self.sentiment_backend not in ('textblob', 'lexicon'):
+            raise ValueError(f"sentiment_backend must be 'textblob' or 'lexicon', got {self.sentiment_backend!r}")
+
+    def _concatenate(self, batches, n):
+        if self.output == 'array':
+            output = np.zeros((n, len(self.get_feature_names_out())), dtype=np.float64)
+            start = 0
+            for batch in batches:
+                output[start:start + len(batch)] = batch
+                start += len(batch)
+        else:
+            output = []
+            for batch in batches:
+                output.extend(batch)
 
-            if self.string_length == True:
-                output = {**output, **self._extract_string_length(item)}
+        return output
 
-            if self.average_token_size == True:
-                output = {**output, **self._extract_average_token_size(item)}
+    def _deduplicate(self, items):
+        # the strings to compute features for, and the inverse index to scatter their results with (None to use the
+        # results as they are)
+        if self.dedupe == True:
+            return _unique(items)
+        return items, None
 
-            if self.stop_word_count == True:
-                output = {**output, **self._extract_stop_word_count(item)}
+    def _scatter(self, output, inverse):
+        if inverse is None:
+            return output
 
-            if self.numerical_token_count == True:
-                output = {**output, **self._extract_numerical_token_count(item)}
+        output = _scatter(output, inverse)
+        if self.output == 'dict':
+            # each string gets its own dictionary, so changing one doesn't change those of its duplicates
+            output = [dict(features) for features in output]
+        return output
 
-            if self.upper_token_count == True:
-                output = {**output, **self._extract_upper_token_count(item)}
+    def transform(self, text, y=None):
+        self._check_parameters()
+        if type(text) == str:
+            text = [text]
 
-            if self.title_token_count == True:
-                output = {**output, **self._extract_title_token_count(item)}
+        text, inverse = self._deduplicate(list(text))
+        if self.n_jobs == 1:
+            return self._scatter(self._process_batch(text), inverse)
 
-            if self.readability_scores == True:
-                output = {**output, **self._extract_readability_scores(item)}
+        output = self._concatenate(self._get_pool().map(_process_batch_in_worker, self._chunks(text)), len(text))
+        return self._scatter(output, inverse)
 
-            if self.language == True:
-                output = {**output, **self._extract_language(item)}
+    def transform_iter(self, text, batch_size=1000, prefetch=2):
+        '''
+        Lazily extracts the features of the strings of any iterable, such as a file of lines, a generator or a database
+        cursor, and yields the result for each string in turn: a dictionary, or a row of the array when
+        output='array'.
 
-            if self.polarity == True:
-                output = {**output, **self._extract_polarity(item)}
+        The iterable is read batch_size strings at a time. With n_jobs greater than 1, up to prefetch further batches
+        are dispatched to the worker pool while the current one is being consumed, so memory use stays bounded.
+        '''
+        self._check_parameters()
+        if type(text) == str:
+            text = [text]
 
-            if self.subjectivity == True:
-                output = {**output, **self._extract_subjectivity(item)}
+        if self.n_jobs == 1:
+            for batch in _batches(text, batch_size):
+                batch, inverse = self._deduplicate(batch)
+                yield from self._scatter(self._process_batch(batch), inverse)
+            return
 
-            if self.title_token_count == True:
-                output = {**output, **self._extract_title_token_count(item)}
+        pool = self._get_pool()
+        pending = deque()
+        for batch in _batches(text, batch_size):
+            batch, inverse = self._deduplicate(batch)
+            pending.append((pool.map_async(_process_batch_in_worker, self._chunks(batch)), len(batch), inverse))
+            if len(pending) > prefetch:
+                result, n, inverse = pending.popleft()
+                yield from self._scatter(self._concatenate(result.get(), n), inverse)
 
-            if self.exclamation_mark_count == True:
-                output = {**output, **self._extract_exclamation_mark_count(item)}
+        while pending:
+            result, n, inverse = pending.popleft()
+            yield from self._scatter(self._concatenate(result.get(), n), inverse)
 
-            if self.question_mark_count == True:
-                output = {**output, **self._extract_question_mark_count(item)}
 
-            if self.number_of_unique_tokens == True:
-                output = {**output, **self._extract_number_of_unique_tokens(item)}
+class TextEntityExtractor(_StreamingMixin, BaseEstimator, TransformerMixin):
+    '''
+    Finds the entities TextReplacer replaces, with the same patterns and the same single scan of each string, but
+    reports them instead: transform returns the number of each entity in each string, and transform_spans returns
+    where they are.
 
-            if self.unique_token_proportion == True:
-                output = {**output, **self._extract_unique_token_proportion(item)}
+    Parameters
+    ----------
 
-            if self.title_token_proportion == True:
-                output = {**output, **self._extract_title_token_proportion(item)}
+    currency_symbols : default: False
+        If True, finds currency symbols.
 
-            if self.upper_token_proportion == True:
-                output = {**output, **self._extract_upper_token_proportion(item)}
+    emails : default: False
+        If True, finds email addresses.
 
-            if self.numerical_token_proportion == True:
-                output = {**output, **self._extract_numerical_token_proportion(item)}
+    hashtags : default: False
+        If True, finds Twitter hashtags.
 
-            if self.stop_word_proportion == True:
-                output = {**output, **self._extract_stop_word_proportion(item)}
+    numbers : default: False
+        If True, finds numerical tokens.
 
-            if self.punctuation_character_count == True:
-                output = {**output, **self._extract_punctuation_character_count(item)}
+    output : default: 'dict'
+        If 'dict', transform returns a list with a dictionary of entity counts for each string.
+        If 'array', transform returns a 2-D int64 NumPy array with a row for each string and a column for each entity,
+        in the order given by get_feature_names_out().
 
-            if self.punctuation_proportion == True:
-                output = {**output, **self._extract_punctuation_proportion(item)}
+    phone_numbers : default: False
+        If True, finds phone numbers.
 
-            if self.contains_profanity == True:
-                output = {**output, **self._extract_profanity_check(item)}
+    urls : default: False
+        If True, finds URLs.
 
-            return output
+    user_handles : default: False
+        If True, finds Twitter user handles.
+    '''
 
-        except Exception as e:
-            print('Caught exception in worker thread (item: \n{}):'.format(item))
-            traceback.print_exc()
-            print()
-            raise e
+    def __init__(self, currency_symbols=False, emails=False, hashtags=False, numbers=False, output='dict',
+                 phone_numbers=False, urls=False, user_handles=False):
+
+        self.currency_symbols = currency_symbols
+        self.emails = emails
+        self.hashtags = hashtags
+        self.numbers = numbers
+        self.output = output
+        self.phone_numbers = phone_numbers
+        self.urls = urls
+        self.user_handles = user_handles
+
+    def _get_entities(self):
+        # (entity, pattern names) for each enabled parameter; both URL patterns count as 'url'
+        return [(names[0], names) for parameter, names in _ENTITY_PARAMETERS if getattr(self, parameter) == True]
+
+    def get_feature_names_out(self, input_features=None):
+        '''
+        Returns the names of the columns of the array returned by transform when output='array'.
+        '''
+        return np.asarray([f'{entity}_count' for entity, names in self._get_entities()], dtype=object)
+
+    def _scan(self, items):
+        # one scan of each string, returning the document, entity index, start and end of every match
+        entities = self._get_entities()
+        codes = {name: i for i, (entity, names) in enumerate(entities) for name in names}
+        patterns = tuple(codes)
+
+        documents, kinds, starts, ends = [], [], [], []
+        if patterns:
+            for i, item in enumerate(items):
+                pattern = find_entity_pattern(item, patterns)
+                if pattern is None:
+                    continue
+
+                for match in pattern.finditer(item):
+                    documents.append(i)
+                    kinds.append(codes[match.lastgroup])
+                    starts.append(match.start())
+                    ends.append(match.end())
+
+        return (np.asarray(documents, dtype=np.int64), np.asarray(kinds, dtype=np.int64),
+                np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64))
+
+    def fit(self, X, y=None):
+        return self
 
     def transform(self, text, y=None):
+        if self.output not in ('dict', 'array'):
+            raise ValueError(f"output must be 'dict' or 'array', got {self.output!r}")
+
         if type(text) == str:
             text = [text]
+        else:
+            text = list(text)
+
+        columns = self.get_feature_names_out()
+        documents, kinds, starts, ends = self._scan(text)
+        counts = np.bincount(documents * len(columns) + kinds, minlength=len(text) * len(columns))
+        counts = counts.reshape(len(text), len(columns))
+        if self.output == 'array':
+            return counts
+
+        return [dict(zip(columns, row)) for row in counts.tolist()]
+
+    def transform_spans(self, text):
+        '''
+        Returns the entities found in the strings as a dictionary of equal-length NumPy arrays, with one element per
+        entity in order of string and position: 'document' (the index of the string), 'entity' (its name, e.g. 'url'),
+        and 'start' and 'end' (its character offsets in the string).
+        '''
+        if type(text) == str:
+            text = [text]
+        else:
+            text = list(text)
+
+        documents, kinds, starts, ends = self._scan(text)
+        names = np.asarray([entity for entity, names in self._get_entities()] or [''])
+        return {'document': documents, 'entity': names[kinds], 'start': starts, 'end': ends}
+
+
+# each worker process builds its own extractor once, from the parameters it was started with
+_worker_extractor = None
+
+
+def _init_worker(params):
+    global _worker_extractor
+    _worker_extractor = TextFeatureExtractor(**params)
 
-        pool = mp.Pool(processes=self.n_jobs)
-        results = [pool.map(self._process_item, text)]
-        return results[0]
 
+def _process_batch_in_worker(items):
+    return _worker_extractor._process_batch(items)
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import re
+from typing import Text
+import numpy as np
+from scipy import sparse
+from langdetect import DetectorFactory, detect_langs
+from langdetect.detector_factory import PROFILES_DIRECTORY
+from langdetect.lang_detect_exception import LangDetectException
+from langdetect.utils.ngram import NGram
+from .utils import _LRUCache
+
+RE_WHITESPACE_RUN = re.compile(r"\s+")
+
+
+class LanguageIdentifier(object):
+    '''
+    Base class for the language identification backends used by TextFeatureExtractor(language=True).
+
+    Subclasses implement _predict_proba, which takes a list of strings and returns, for each string, a dictionary
+    mapping language codes to probabilities, and set languages to the codes they can return. Results for short
+    strings are cached on their normalized text (case and white space), since short messages are often repeated.
+
+    Parameters
+    ----------
+
+    cache_size : default: 100000
+        The maximum number of short strings whose results are cached. If 0, nothing is cached.
+
+    max_cached_length : default: 200
+        Only strings up to this many characters are cached.
+    '''
+
+    languages = ()
+
+    def __init__(self, cache_size=100000, max_cached_length=200):
+        self.cache_size = cache_size
+        self.max_cached_length = max_cached_length
+        self._cache = _LRUCache(cache_size)
+
+    def _predict_proba(self, texts):
+        raise NotImplementedError
+
+    def predict_proba(self, texts):
+        '''Returns a dictionary of language code -> probability for each string in texts.'''
+        output = [None] * len(texts)
+        keys = [None] * len(texts)
+        missing = []
+        for i, text in enumerate(texts):
+            if self.cache_size and len(text) <= self.max_cached_length:
+                keys[i] = RE_WHITESPACE_RUN.sub(' ', text).strip().lower()
+                output[i] = self._cache.get(keys[i])
+            if output[i] is None:
+                missing.append(i)
+
+        # texts that normalize to the same cache key are only identified once
+        first = {}
+        unique = []
+        for i in missing:
+            if keys[i] is None or keys[i] not in first:
+                if keys[i] is not None:
+                    first[keys[i]] = len(unique)
+                unique.append(i)
+
+        results = self._predict_proba([texts[i] for i in unique]) if unique else []
+        for i, result in zip(unique, results):
+            output[i] = result
+            if keys[i] is not None:
+                self._cache[keys[i]] = result
+
+        for i in missing:
+            if output[i] is None:
+                output[i] = results[first[keys[i]]]
+
+        return output
+
+    def __getstate__(self):
+        # workers start with an empty cache rather than a copy of the parent's
+        state = self.__dict__.copy()
+        state['_cache'] = _LRUCache(self.cache_size)
+        return state
+
+
+class LangDetectIdentifier(LanguageIdentifier):
+    '''
+    Identifies languages with the langdetect library, a port of Google's language-detection library. langdetect is
+    randomised, so its process-wide seed (langdetect.DetectorFactory.seed) is set to seed during each call to make the
+    output deterministic, and restored afterwards. Strings langdetect can't find any features in (such as empty
+    strings) get no languages.
+
+    See https://github.com/Mimino666/langdetect.
+
+    Parameters
+    ----------
+
+    seed : default: 0
+        The seed langdetect is run with.
+    '''
+
+    languages = tuple(sorted(os.listdir(PROFILES_DIRECTORY)))
+
+    def __init__(self, seed=0, cache_size=100000, max_cached_length=200):
+        super().__init__(cache_size=cache_size, max_cached_length=max_cached_length)
+        self.seed = seed
+
+    def _detect(self, text: Text):
+        try:
+            return {item.lang: item.prob for item in detect_langs(text)}
+        except LangDetectException:
+            return {}
+
+    def _predict_proba(self, texts):
+        seed = DetectorFactory.seed
+        DetectorFactory.seed = self.seed
+        try:
+            return [self._detect(text) for text in texts]
+        finally:
+            DetectorFactory.seed = seed
+
+
+class _NGramNormalizationTable(dict):
+    # maps each character to the form langdetect's profiles were built with, resolved on first use
+    def __missing__(self, key):
+        value = self[key] = NGram.normalize(chr(key))
+        return value
+
+
+class NGramProfileIdentifier(LanguageIdentifier):
+    '''
+    A compact naive Bayes language identifier over character 1-3 grams, built from the most frequent n-grams of each
+    of langdetect's language profiles. A batch of strings is scored with one sparse matrix product, and the output
+    is deterministic.
+
+    Parameters
+    ----------
+
+    n_ngrams : default: 1000
+        The number of most frequent n-grams kept from each language profile.
+
+    min_probability : default: 0.1
+        Languages with a lower probability than this are left out of the result.
+    '''
+
+    languages = LangDetectIdentifier.languages
+
+    def __init__(self, n_ngrams=1000, min_probability=0.1, cache_size=100000, max_cached_length=200):
+        super().__init__(cache_size=cache_size, max_cached_length=max_cached_length)
+        self.n_ngrams = n_ngrams
+        self.min_probability = min_probability
+        self._model = None
+
+    def _get_model(self):
+        if self._model is None:
+            profiles = []
+            for lang in self.languages:
+                with open(os.path.join(PROFILES_DIRECTORY, lang), encoding='utf-8') as f:
+                    profiles.append(json.load(f))
+
+            vocabulary = {}
+            for profile in profiles:
+                for ngram in sorted(profile['freq'], key=lambda ngram: -profile['freq'][ngram])[:self.n_ngrams]:
+                    vocabulary.setdefault(ngram, len(vocabulary))
+
+            # the profiles only keep n-grams above a frequency cut-off, so an n-gram missing from a profile is given
+            # half of that profile's lowest count rather than a fixed add-one count, which would penalise the large
+            # profiles far more than the small ones
+            log_probabilities = np.empty((len(vocabulary), len(profiles)), dtype=np.float64)
+            lengths = np.array([len(ngram) for ngram in vocabulary])
+            for j, profile in enumerate(profiles):
+                counts = np.array([profile['freq'].get(ngram, 0) for ngram in vocabulary], dtype=np.float64)
+                totals = np.array(profile['n_words'], dtype=np.float64)[lengths - 1]
+                log_probabilities[:, j] = np.log(np.maximum(counts, 0.5 * min(profile['freq'].values())) / totals)
+
+            self._model = (vocabulary, log_probabilities, _NGramNormalizationTable())
+
+        return self._model
+
+    def _predict_proba(self, texts):
+        vocabulary, log_probabilities, normalization = self._get_model()
+        rows, columns = [], []
+        for i, text in enumerate(texts):
+            text = ' ' + RE_WHITESPACE_RUN.sub(' ', text.translate(normalization)).strip() + ' '
+            for n in (1, 2, 3):
+                for k in range(len(text) - n + 1):
+                    j = vocabulary.get(text[k:k + n])
+                    if j is not None:
+                        rows.append(i)
+                        columns.append(j)
+
+        counts = sparse.csr_matrix((np.ones(len(rows)), (rows, columns)), shape=(len(texts), len(vocabulary)))
+        scores = np.asarray(counts @ log_probabilities)
+        scores -= scores.max(axis=1, keepdims=True)
+        probabilities = np.exp(scores)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+
+        output = []
+        for i in range(len(texts)):
+            if counts.indptr[i] == counts.indptr[i + 1]:
+                # no known n-grams, so there is no evidence for any language
+                output.append({})
+            else:
+                output.append({self.languages[j]: float(probabilities[i, j])
+                               for j in np.argsort(-probabilities[i]) if probabilities[i, j] >= self.min_probability})
+
+        return output
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['_model'] = None
+        return state
+
+
+_LANGUAGE_IDENTIFIERS = {
+    'langdetect': LangDetectIdentifier,
+    'ngram': NGramProfileIdentifier,
+}
+
+
+def get_language_identifier(backend) -> LanguageIdentifier:
+    '''Returns backend if it is a LanguageIdentifier, otherwise a new instance of the backend it names.'''
+    if isinstance(backend, LanguageIdentifier):
+        return backend
+
+    if backend not in _LANGUAGE_IDENTIFIERS:
+        raise ValueError(f"language_backend must be one of {sorted(_LANGUAGE_IDENTIFIERS)} or a LanguageIdentifier, "
+                         f"got {backend!r}")
+
+    return _LANGUAGE_IDENTIFIERS[backend]()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import html
+from html.parser import HTMLParser
+from typing import Text
+
+# elements whose content is code or an inert template rather than text
+_SKIPPED_ELEMENTS = frozenset(['script', 'style', 'template'])
+
+# elements inside which white space is kept as it is
+_PREFORMATTED_ELEMENTS = frozenset(['pre', 'textarea'])
+
+_ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+
+def _collapse_whitespace(data: Text) -> Text:
+    # as BeautifulSoup does, a string of nothing but white space between two tags becomes a newline or a space
+    if data.strip(_ASCII_SPACES):
+        return data
+    return '\n' if '\n' in data else ' '
+
+
+class _TextCollector(HTMLParser):
+    # collects the text of a document as the parser streams through it, without building a tree
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skipped_depth = 0
+        self.preformatted_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIPPED_ELEMENTS:
+            self.skipped_depth += 1
+        elif tag in _PREFORMATTED_ELEMENTS:
+            self.preformatted_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in _SKIPPED_ELEMENTS and self.skipped_depth > 0:
+            self.skipped_depth -= 1
+        elif tag in _PREFORMATTED_ELEMENTS and self.preformatted_depth > 0:
+            self.preformatted_depth -= 1
+
+    def handle_data(self, data):
+        if self.skipped_depth == 0:
+            self.parts.append(data if self.preformatted_depth > 0 else _collapse_whitespace(data))
+
+    def unknown_decl(self, data):
+        if data.startswith('CDATA[') and self.skipped_depth == 0:
+            self.parts.append(data[6:])
+
+
+def strip_html(text: Text) -> Text:
+    '''
+    Returns the text of an HTML document with its tags, comments and declarations removed, the content of script,
+    style and template elements dropped and character references decoded. The document is streamed through
+    html.parser.HTMLParser instead of being built into a tree, and strings without a '<' are only unescaped.
+
+    The output matches BeautifulSoup(text, "html.parser").get_text() apart from rare malformed character references.
+    '''
+    if '<' not in text:
+        return html.unescape(text) if '&' in text else _collapse_whitespace(text) if text else text
+
+    parser = _TextCollector()
+    parser.feed(text)
+    parser.close()
+    return ''.join(parser.parts)
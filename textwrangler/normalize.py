@@ -1,16 +1,18 @@
 # -*- coding: utf-8 -*-
 import unicodedata
-import re
-from typing import Text
-from textblob import TextBlob
+from typing import Text, Dict
+from textblob import Word
 from sklearn.base import BaseEstimator, TransformerMixin
 from .patterns import (
+    RE_HYPHENATED_LETTERS,
     RE_NONBREAKING_SPACE,
     RE_LINEBREAK,
+    RE_WORD,
     QUOTE_TRANSLATION_TABLE
 )
+from .utils import _LRUCache, _StreamingMixin, _fuse_steps, _run_steps, _scatter, _unique
 
-class TextNormalizer(BaseEstimator, TransformerMixin):
+class TextNormalizer(_StreamingMixin, BaseEstimator, TransformerMixin):
     '''
 
     Parameters
@@ -19,6 +21,9 @@ class TextNormalizer(BaseEstimator, TransformerMixin):
     case : default: False
         If True, all characters are converted to lowercase.
 
+    dedupe : default: False
+        If True, transform normalizes each distinct string of a batch once and copies the result to its duplicates.
+
     hyphenated_words : default: False
         If True, hyphens in hypenated words are converted to spaces. For example,
 
@@ -33,6 +38,14 @@ class TextNormalizer(BaseEstimator, TransformerMixin):
         If True, the correction of spelling mistakes is attempted with TextBlob's correct method.
         See https://textblob.readthedocs.io/en/dev/api_reference.html#textblob.blob.TextBlob.correct.
 
+        Each word is corrected once and the result is kept in a cache, and transform corrects the unique words of the
+        whole batch before rewriting the strings. The cache can be saved with save_spelling_cache and reloaded with
+        load_spelling_cache.
+
+    spelling_cache_size : default: 100000
+        The maximum number of word corrections kept in the spelling cache. The least recently used corrections are
+        discarded first. If None, the cache is unbounded.
+
     unicode_characters : default: False
         If True, unicode characters are normalized.
         Copied from Textacy's preprocessing functionality (but without the SpaCy dependency).
@@ -42,24 +55,58 @@ class TextNormalizer(BaseEstimator, TransformerMixin):
         Copied from Textacy's preprocessing functionality (but without the SpaCy dependency).
     '''
 
-    def __init__(self, case=False, hyphenated_words=False, quotation_marks=False, spelling=False, unicode_characters=False,
-                 whitespace=False):
+    def __init__(self, case=False, dedupe=False, hyphenated_words=False, quotation_marks=False, spelling=False,
+                 spelling_cache_size=100000, unicode_characters=False, whitespace=False):
 
         self.case = case
+        self.dedupe = dedupe
         self.hyphenated_words = hyphenated_words
         self.quotation_marks = quotation_marks
         self.spelling = spelling
+        self.spelling_cache_size = spelling_cache_size
         self.unicode_characters = unicode_characters
         self.whitespace = whitespace
 
     def _normalize_case(self, text: Text) -> Text:
         return text.lower()
 
-    def _normalize_spelling(self, text: Text) -> Text:
-        return str(TextBlob(text).correct())
+    def _get_spelling_cache(self) -> _LRUCache:
+        cache = getattr(self, '_spelling_cache', None)
+        if cache is None:
+            cache = self._spelling_cache = _LRUCache(self.spelling_cache_size)
+        cache.maxsize = self.spelling_cache_size
+        return cache
+
+    def save_spelling_cache(self, path):
+        '''Writes the cached word corrections to a JSON file.'''
+        self._get_spelling_cache().save(path)
+
+    def load_spelling_cache(self, path):
+        '''Adds the word corrections in a JSON file written by save_spelling_cache to the cache.'''
+        self._get_spelling_cache().load(path)
+        return self
+
+    def _correct_words(self, words) -> Dict:
+        cache = self._get_spelling_cache()
+        corrections = {}
+        for word in words:
+            correction = cache.get(word)
+            if correction is None:
+                correction = cache[word] = str(Word(word).correct())
+            corrections[word] = correction
+
+        return corrections
+
+    def _normalize_spelling(self, text: Text, corrections=None) -> Text:
+        # TextBlob.correct only ever changes runs of word characters, so correcting each word and substituting it
+        # back gives the same string
+        if corrections is None:
+            corrections = self._correct_words(set(RE_WORD.findall(text)))
+
+        return RE_WORD.sub(lambda match: corrections[match.group()], text)
 
     def _normalize_hyphenated_words(self, text: Text) -> Text:
-        return re.sub(r'([a-zA-Z])-([a-zA-Z])', r'\1 \2', text)
+        return RE_HYPHENATED_LETTERS.sub(r'\1 \2', text)
 
     def _normalize_quotation_marks(self, text: Text) -> Text:
         return text.translate(QUOTE_TRANSLATION_TABLE)
@@ -70,35 +117,47 @@ class TextNormalizer(BaseEstimator, TransformerMixin):
     def _normalize_whitespace(self, text: Text) -> Text:
         return RE_NONBREAKING_SPACE.sub(" ", RE_LINEBREAK.sub(r"\n", text)).strip()
 
-    def fit(self, X, y=None):
-        return self
-
-    def transform(self, text, y=None):
-
-        output = []
-        if type(text) == str:
-            text = [text]
+    def _compile_steps(self):
+        steps = []
+        if self.spelling == True:
+            steps.append(('call', self._normalize_spelling))
 
-        for item in text:
+        if self.case == True:
+            steps.append(('call', self._normalize_case))
 
-            if self.spelling == True:
-                item = self._normalize_spelling(item)
+        if self.hyphenated_words == True:
+            steps.append(('call', self._normalize_hyphenated_words))
 
-            if self.case == True:
-                item = self._normalize_case(item)
+        if self.quotation_marks == True:
+            steps.append(('translate', QUOTE_TRANSLATION_TABLE))
 
-            if self.hyphenated_words == True:
-                item = self._normalize_hyphenated_words(item)
+        if self.unicode_characters == True:
+            steps.append(('call', self._normalize_unicode))
 
-            if self.quotation_marks == True:
-                item = self._normalize_quotation_marks(item)
+        if self.whitespace == True:
+            steps.append(('call', self._normalize_whitespace))
 
-            if self.unicode_characters == True:
-                item = self._normalize_unicode(item)
+        return steps
 
-            if self.whitespace == True:
-                item = self._normalize_whitespace(item)
+    def fit(self, X, y=None):
+        return self
 
-            output.append(item)
+    def transform(self, text, y=None):
+        if type(text) == str:
+            text = [text]
 
-        return output
+        inverse = None
+        if self.dedupe == True:
+            text, inverse = _unique(text)
+
+        steps = self._compile_steps()
+        if self.spelling == True:
+            # correct every unique word in the batch once, then rewrite the strings from the corrections (spelling is
+            # always the first step)
+            text = list(text)
+            corrections = self._correct_words(set(word for item in text for word in RE_WORD.findall(item)))
+            steps[0] = ('call', lambda item: self._normalize_spelling(item, corrections))
+
+        steps = _fuse_steps(steps)
+        output = [_run_steps(item, steps) for item in text]
+        return output if inverse is None else _scatter(output, inverse)
@@ -1,4 +1,6 @@
 import re
+import string
+from functools import lru_cache
 # largely taken from https://github.com/chartbeat-labs/textacy/blob/master/textacy/preprocessing/resources.py
 
 RE_LINEBREAK = re.compile(r"(\r\n|[\n\v])+")
@@ -79,14 +81,95 @@ RE_NUMBER = re.compile(
     r"(([1-9]\d{0,2}(,\d{3})+(\.\d*)?)|([1-9]\d{0,2}([ .]\d{3})+(,\d*)?)|(\d*?[.,]\d+)|\d+)"
     r"(?:$|(?=\b))")
 
+RE_WORD = re.compile(r"\w+")
+
+# a run of ASCII digits that NLTK's word tokenizer would split off as a token of its own, e.g. "12" in "12 apples",
+# "($12)" or "12's", but not in "1,000", "3.5", "555-1234", "10:30" or "2020/01/05". The tokenizer splits at white
+# space, brackets, quotes, dashes and ;@#$%&?!*, at commas and colons not followed by a digit, at "--" and "..", at
+# sentence-final periods and around quoting apostrophes and clitics such as 's; hyphens, slashes and other inner
+# punctuation stay in the token.
+_TOKEN_SEPARATORS = "\\s;@#$%&?!*()\\[\\]{}<>\"`«»“”‘’„\u2012-\u2015"
+RE_DIGIT_TOKEN = re.compile(
+    rf"""(?:^|(?<=[{_TOKEN_SEPARATORS}])|(?<=--)|(?<=\.\.)|(?<=(?<!\w)'))
+        [0-9]+
+        (?=(?:'(?:[sSmMdD]|ll|LL|re|RE|ve|VE)?)?
+           (?:$|[{_TOKEN_SEPARATORS}]|[,:](?![0-9])|--|\.\.|\.[\]\)}}>"']*(?:\s|$))|'')""",
+    flags=re.VERBOSE
+)
+
 RE_CURRENCY_SYMBOL = re.compile(
     r"[$¢£¤¥ƒ֏؋৲৳૱௹฿៛ℳ元円圆圓﷼\u20A0-\u20C0]",
     flags=re.UNICODE)
 
+# the entity patterns in priority order: where two of them match at the same position, the first one listed wins
+ENTITY_PATTERNS = (
+    ('url', RE_URL),
+    ('short_url', RE_SHORT_URL),
+    ('email', RE_EMAIL),
+    ('phone_number', RE_PHONE_NUMBER),
+    ('user_handle', RE_USER_HANDLE),
+    ('hashtag', RE_HASHTAG),
+    ('currency_symbol', RE_CURRENCY_SYMBOL),
+    ('number', RE_NUMBER),
+)
+
+
+RE_DIGIT = re.compile(r"\d")
+RE_WWW = re.compile(r"www", flags=re.IGNORECASE)
+
+# cheap tests that rule out text an entity pattern can't match, each looking for something the pattern requires;
+# None means the pattern is always run
+ENTITY_PREFILTERS = {
+    'url': lambda text: '://' in text or RE_WWW.search(text) is not None,
+    'short_url': lambda text: '/' in text,
+    'email': lambda text: '@' in text,
+    'phone_number': lambda text: RE_DIGIT.search(text) is not None,
+    'user_handle': lambda text: '@' in text,
+    'hashtag': lambda text: '#' in text or '＃' in text,
+    'currency_symbol': None,
+    'number': lambda text: RE_DIGIT.search(text) is not None,
+}
+
+
+@lru_cache(maxsize=None)
+def compile_entity_pattern(entities):
+    '''
+    Combines the patterns of the named entities (a tuple of names from ENTITY_PATTERNS) into one alternation with a
+    named group for each, so a single left-to-right scan finds all of them and match.lastgroup names the entity.
+
+    Matches never overlap: the leftmost match wins, then the entity listed first in ENTITY_PATTERNS, and the scan
+    resumes after it, so a URL is matched as a whole rather than as the numbers inside it.
+    '''
+    alternatives = []
+    for name, pattern in ENTITY_PATTERNS:
+        if name in entities:
+            flags = 'i' if pattern.flags & re.IGNORECASE else ''
+            alternatives.append(f"(?P<{name}>(?{flags}:{pattern.pattern}))")
+
+    return re.compile('|'.join(alternatives), flags=re.UNICODE)
+
+
+def find_entity_pattern(text, entities):
+    '''
+    Returns the compile_entity_pattern of those entities whose prefilter passes for text, or None if none of them can
+    match. The dropped patterns can't match anywhere in text, so the result finds exactly the same matches as the
+    pattern of all the entities, without running the expensive patterns (RE_URL above all) on text without them.
+    '''
+    candidates = tuple(name for name in entities
+                       if ENTITY_PREFILTERS[name] is None or ENTITY_PREFILTERS[name](text))
+    return compile_entity_pattern(candidates) if candidates else None
+
+
+RE_HYPHENATED_LETTERS = re.compile(r"([a-zA-Z])-([a-zA-Z])")
+
 RE_HYPHENATED_WORD = re.compile(
     r"(\w{2,}(?<!\d))\-\s+((?!\d)\w{2,})",
     flags=re.UNICODE | re.IGNORECASE)
 
 QUOTE_TRANSLATION_TABLE = {
     ord(x): ord(y)
-    for x, y in zip("‘’´`“”", "''''\"\"")}
\ No newline at end of file
+    for x, y in zip("‘’´`“”", "''''\"\"")}
+
+PUNCTUATION_TRANSLATION_TABLE = str.maketrans({x: ' ' for x in string.punctuation})
+
+DIGIT_TRANSLATION_TABLE = str.maketrans('', '', string.digits)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+from sklearn.base import BaseEstimator, TransformerMixin
+from .utils import _StreamingMixin, _fuse_steps, _run_steps, _scatter, _unique
+
+
+class TextPipeline(_StreamingMixin, BaseEstimator, TransformerMixin):
+    '''
+    Runs a chain of TextNormalizer, TextRemover and TextReplacer instances as a single pass over the documents.
+
+    The per-document steps of all the transformers are concatenated in order and compatible neighbours are fused:
+    consecutive translate tables (quotation marks, punctuation, digits, ...) are merged into one table, so each
+    document is walked once per fused step rather than once per transformer, and no intermediate lists are built.
+
+    Transformers that work on a whole batch rather than on each document independently, such as
+    FingerPrintTransformer, can also be included; the documents are collected into a list at that point and passed
+    to their transform method.
+
+    Parameters
+    ----------
+
+    steps : list
+        The transformers to apply, in order.
+
+    dedupe : default: False
+        If True, the per-string steps are run once for each distinct string of a batch and the result is copied to its
+        duplicates. Transformers that work on a whole batch still receive every string. The dedupe parameters of the
+        chained transformers are not used.
+    '''
+
+    def __init__(self, steps, dedupe=False):
+        self.steps = steps
+        self.dedupe = dedupe
+
+    def _compile(self):
+        segments = []
+        for transformer in self.steps:
+            compile_steps = getattr(transformer, '_compile_steps', None)
+            steps = compile_steps() if compile_steps is not None else None
+            if steps is None:
+                segments.append(('transformer', transformer))
+            elif segments and segments[-1][0] == 'steps':
+                segments[-1] = ('steps', segments[-1][1] + steps)
+            else:
+                segments.append(('steps', steps))
+
+        return [(kind, _fuse_steps(value) if kind == 'steps' else value) for kind, value in segments]
+
+    def _apply_steps(self, text, steps):
+        if self.dedupe == True:
+            unique, inverse = _unique(text)
+            return _scatter([_run_steps(item, steps) for item in unique], inverse)
+
+        return [_run_steps(item, steps) for item in text]
+
+    def _fit(self, text, method):
+        # fits each batch transformer on the strings as the transformers before it leave them
+        if type(text) == str:
+            text = [text]
+
+        segments = self._compile()
+        for i, (kind, value) in enumerate(segments):
+            if kind == 'steps':
+                text = self._apply_steps(text, value)
+                continue
+
+            fit = getattr(value, method, None)
+            if fit is not None:
+                fit(text)
+            if i < len(segments) - 1:
+                text = value.transform(text)
+
+        return self
+
+    def fit(self, X, y=None):
+        '''
+        Fits the transformers that work on a whole batch, such as FingerPrintTransformer, each on the strings as the
+        transformers before it leave them.
+        '''
+        return self._fit(X, 'fit')
+
+    def partial_fit(self, X, y=None):
+        '''
+        Updates the transformers that work on a whole batch and support partial_fit, such as FingerPrintTransformer,
+        each with the strings as the transformers before it leave them.
+        '''
+        return self._fit(X, 'partial_fit')
+
+    def transform(self, text, y=None):
+        if type(text) == str:
+            text = [text]
+
+        for kind, value in self._compile():
+            if kind == 'steps':
+                text = self._apply_steps(text, value)
+            else:
+                text = value.transform(text)
+
+        return text
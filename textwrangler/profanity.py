@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+import re
+from functools import lru_cache
+from typing import Text
+from better_profanity import profanity
+from better_profanity.constants import ALLOWED_CHARACTERS
+from better_profanity.utils import get_complete_path_of_file, read_wordlist
+
+
+class ProfanityMatcher(object):
+    '''
+    Finds profane words and phrases in strings. The wordlist and its leetspeak variants are compiled once into a trie
+    whose edges already carry every character that can stand in for a letter (in either case), so a string is checked
+    with one pass over its words, following a few trie nodes from each word that starts like an entry.
+
+    Words are runs of the characters better_profanity treats as part of a word, and matches are whole words, as in
+    better_profanity: an entry matches one word, or consecutive words joined either directly ("blow job" as
+    "blowjob", "f u c k" as "fuck") or by all the separators between them. Also as in better_profanity, a match spans
+    at most one word more than the most separators in any entry, so words spaced out further (such as
+    "b-u-l-l-s-h-i-t" with the default wordlist) aren't matched, and a single character ending the string is never
+    joined to the words before it.
+
+    Parameters
+    ----------
+
+    words : default: None
+        The words and phrases to match. If None, uses better_profanity's wordlist.
+
+    char_map : default: None
+        A dictionary mapping characters to the characters that may be written in their place. If None, uses
+        better_profanity's leetspeak mapping, e.g. 'a' may be written as '@', '*' or '4'.
+    '''
+
+    def __init__(self, words=None, char_map=None):
+        self.words = words
+        self.char_map = char_map
+        self._compile()
+
+    def _compile(self):
+        words = read_wordlist(get_complete_path_of_file('profanity_wordlist.txt')) if self.words is None else self.words
+        char_map = profanity.CHARS_MAPPING if self.char_map is None else self.char_map
+
+        # the trie of the entries, by their own characters
+        children = [{}]
+        terminal = [False]
+        words = set(word.strip().lower() for word in words) - {''}
+        for word in words:
+            node = 0
+            for char in word:
+                if char not in children[node]:
+                    children[node][char] = len(children)
+                    children.append({})
+                    terminal.append(False)
+                node = children[node][char]
+            terminal[node] = True
+
+        # the number of words following the first that an entry may span, as better_profanity's
+        # MAX_NUMBER_COMBINATIONS
+        next_words = max([sum(char not in ALLOWED_CHARACTERS for char in word) for word in words] + [1])
+
+        # each edge is also reachable by every variant of its character, so a node maps an input character to the
+        # tuple of nodes it leads to (more than one when a variant such as '@' stands for several letters)
+        edges = []
+        for node_children in children:
+            node_edges = {}
+            for char, child in node_children.items():
+                for variant in set(char_map.get(char, ())) | {char}:
+                    for form in {variant, variant.upper()}:
+                        if len(form) == 1 and child not in node_edges.setdefault(form, ()):
+                            node_edges[form] += (child,)
+            edges.append(node_edges)
+
+        self._edges = edges
+        self._terminal = terminal
+        self._next_words = next_words
+        self._word_pattern = re.compile('[' + ''.join(re.escape(char) for char in sorted(ALLOWED_CHARACTERS)) + ']+')
+
+    def _step(self, nodes, char):
+        edges = self._edges
+        return tuple(child for node in nodes for child in edges[node].get(char, ()))
+
+    def _match(self, text: Text, words, k: int) -> int:
+        # the end offset of the entry starting at word k, or -1. As in better_profanity, the entries spanning several
+        # words come first, shortest first, and then the entries matching word k alone
+        terminal = self._terminal
+        start, stop = words[k]
+        nodes = (0,)
+        for char in text[start:stop]:
+            nodes = self._step(nodes, char)
+            if not nodes:
+                return -1
+
+        single = stop if any(terminal[node] for node in nodes) else -1
+        # the separators between the words are either all skipped or all matched as part of the entry
+        joined = separated = nodes
+        for j in range(k + 1, min(k + 1 + self._next_words, len(words))):
+            start, stop = words[j]
+            if start >= len(text) - 1:
+                break
+            for char in text[words[j - 1][1]:start]:
+                separated = self._step(separated, char)
+
+            for char in text[start:stop]:
+                joined = self._step(joined, char)
+                separated = self._step(separated, char)
+            if not joined and not separated:
+                break
+            if any(terminal[node] for node in joined + separated):
+                return stop
+
+        return single
+
+    def _scan(self, text: Text, first_only=False):
+        spans = []
+        root = self._edges[0]
+        words = [match.span() for match in self._word_pattern.finditer(text)]
+        if not words or words[0][0] >= len(text) - 1:
+            # better_profanity leaves a string whose first word is its last character unchecked
+            return spans
+
+        k = 0
+        while k < len(words):
+            start = words[k][0]
+            end = self._match(text, words, k) if text[start] in root else -1
+            if end < 0:
+                k += 1
+                continue
+
+            spans.append((start, end))
+            if first_only:
+                break
+            while k < len(words) and words[k][0] < end:
+                k += 1
+
+        return spans
+
+    def contains(self, text: Text) -> bool:
+        '''Returns True if text contains profanity, stopping at the first match.'''
+        return len(self._scan(text, first_only=True)) > 0
+
+    def count(self, text: Text) -> int:
+        '''Returns the number of non-overlapping profane words and phrases in text.'''
+        return len(self._scan(text))
+
+    def spans(self, text: Text):
+        '''Returns the (start, end) character offsets of the non-overlapping profane words and phrases in text.'''
+        return self._scan(text)
+
+
+@lru_cache(maxsize=None)
+def get_profanity_matcher() -> ProfanityMatcher:
+    '''Returns the matcher for the default wordlist, compiled once per process.'''
+    return ProfanityMatcher()
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+'''
+Native versions of the textstat readability scores (English). textstat recounts the sentences, words and syllables
+of a text inside every score function; here a text is segmented once into a _ReadabilityStats and all the scores
+are derived from it. The formulas, counting rules and (unrounded) outputs follow textstat 0.7.13, the version pinned
+in setup.py. Results can differ from other textstat versions, which changed formulas and rounding, and from textstat
+itself when the NLTK cmudict corpus is neither installed nor downloadable: syllables are then counted with pyphen
+only (see syllable_source), where textstat fails.
+'''
+import math
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Text, Dict
+import nltk
+import textstat
+from pyphen import Pyphen
+
+RE_SENTENCE = re.compile(r"\b[^.!?]+[.!?]*", flags=re.UNICODE)
+RE_WHITESPACE_CHARACTER = re.compile(r"\s")
+RE_NONCONTRACTION_APOSTROPHE = re.compile(r"\'(?!(?:[tsd]|ve|ll|re))")
+RE_PUNCTUATION_EXCEPT_APOSTROPHE = re.compile(r"[^\w\s\']")
+RE_PUNCTUATION = re.compile(r"[^\w\s]")
+
+READABILITY_SCORES = ('flesch_reading_ease', 'smog_index', 'flesch_kincaid_grade', 'coleman_liau_index',
+                      'automated_readability_index', 'dale_chall_readability_score', 'difficult_words',
+                      'linsear_write_formula', 'gunning_fog', 'text_standard')
+
+_pyphen = None
+_cmudict = None
+_easy_words = None
+
+
+def _get_easy_words() -> frozenset:
+    # the Dale-Chall list of familiar words that ships with textstat
+    global _easy_words
+    if _easy_words is None:
+        path = os.path.join(os.path.dirname(textstat.__file__), 'resources', 'en', 'easy_words.txt')
+        with open(path, encoding='utf-8') as f:
+            _easy_words = frozenset(line.strip() for line in f)
+
+    return _easy_words
+
+
+def _get_cmudict() -> Dict:
+    # the CMU pronouncing dictionary, downloaded the first time it is needed if it isn't installed, as textstat does,
+    # or an empty dictionary if it can't be downloaded
+    global _cmudict
+    if _cmudict is None:
+        try:
+            nltk.data.find('corpora/cmudict')
+        except LookupError:
+            nltk.download('cmudict', quiet=True)
+        try:
+            _cmudict = nltk.corpus.cmudict.dict()
+        except LookupError:
+            _cmudict = {}
+
+    return _cmudict
+
+
+def syllable_source() -> Text:
+    '''
+    Returns 'cmudict' if syllable_count looks words up in the CMU pronouncing dictionary, or 'pyphen' if the NLTK
+    corpus isn't available and syllables are only counted from hyphenation points. The scores depend on it.
+    '''
+    return 'cmudict' if _get_cmudict() else 'pyphen'
+
+
+@lru_cache(maxsize=2 ** 16)
+def syllable_count(word: Text) -> int:
+    '''
+    Counts the syllables of a lowercase word from its CMU pronouncing dictionary entry if the NLTK cmudict corpus is
+    available, otherwise from its pyphen hyphenation points. Results are memoized, so each distinct word is only
+    looked up once.
+    '''
+    global _pyphen
+    phones = _get_cmudict().get(word)
+    if phones:
+        return sum(1 for phone in phones[0] if phone[-1].isdigit())
+
+    if _pyphen is None:
+        _pyphen = Pyphen(lang='en_US')
+    return len(_pyphen.positions(word)) + 1
+
+
+def _list_words(text: Text):
+    # words with punctuation removed, keeping the apostrophes of contractions
+    return RE_PUNCTUATION_EXCEPT_APOSTROPHE.sub('', RE_NONCONTRACTION_APOSTROPHE.sub('', text)).split()
+
+
+def _count_sentences(text: Text) -> int:
+    if len(text) == 0:
+        return 0
+
+    sentences = RE_SENTENCE.findall(text)
+    ignored = sum(1 for sentence in sentences if len(_list_words(sentence)) <= 2)
+    return max(1, len(sentences) - ignored)
+
+
+class _ReadabilityStats(object):
+    '''
+    The sentence, word, character and syllable counts of a text that the readability scores are computed from.
+    '''
+
+    def __init__(self, text: Text):
+        self.text = text
+        self.words = _list_words(text)
+        self.syllables = [syllable_count(word.lower()) for word in self.words]
+        easy_words = _get_easy_words()
+        self.easy = [word.lower() in easy_words for word in self.words]
+
+        self.word_count = len(self.words)
+        self.sentence_count = _count_sentences(text)
+        self.syllable_count = sum(self.syllables)
+        self.polysyllable_count = sum(1 for syllables in self.syllables if syllables >= 3)
+
+        text_without_whitespace = RE_WHITESPACE_CHARACTER.sub('', text)
+        self.character_count = len(text_without_whitespace)
+        self.letter_count = len(RE_PUNCTUATION.sub('', text_without_whitespace))
+        self.token_count = len(text.split())
+
+    def difficult_word_count(self, syllable_threshold: int) -> int:
+        return sum(1 for easy, syllables in zip(self.easy, self.syllables)
+                   if not easy and syllables >= syllable_threshold)
+
+    @property
+    def words_per_sentence(self) -> float:
+        return self.word_count / self.sentence_count if self.sentence_count else 0.0
+
+    @property
+    def syllables_per_word(self) -> float:
+        return self.syllable_count / self.word_count if self.word_count else 0.0
+
+
+def flesch_reading_ease(stats: _ReadabilityStats) -> float:
+    if stats.words_per_sentence == 0 or stats.syllables_per_word == 0:
+        return 0.0
+    return 206.835 - 1.015 * stats.words_per_sentence - 84.6 * stats.syllables_per_word
+
+
+def smog_index(stats: _ReadabilityStats) -> float:
+    if stats.sentence_count == 0:
+        return 0.0
+    return 1.043 * (30 * (stats.polysyllable_count / stats.sentence_count)) ** 0.5 + 3.1291
+
+
+def flesch_kincaid_grade(stats: _ReadabilityStats) -> float:
+    if stats.words_per_sentence == 0 or stats.syllables_per_word == 0:
+        return 0.0
+    return 0.39 * stats.words_per_sentence + 11.8 * stats.syllables_per_word - 15.59
+
+
+def coleman_liau_index(stats: _ReadabilityStats) -> float:
+    if stats.word_count == 0 or stats.letter_count == 0 or stats.sentence_count == 0:
+        return 0.0
+    letters = stats.letter_count / stats.word_count * 100
+    sentences = stats.sentence_count / stats.word_count * 100
+    return 0.058 * letters - 0.296 * sentences - 15.8
+
+
+def automated_readability_index(stats: _ReadabilityStats) -> float:
+    characters_per_word = stats.character_count / stats.token_count if stats.token_count else 0.0
+    if characters_per_word == 0 or stats.words_per_sentence == 0:
+        return 0.0
+    return 4.71 * characters_per_word + 0.5 * stats.words_per_sentence - 21.43
+
+
+def dale_chall_readability_score(stats: _ReadabilityStats) -> float:
+    if stats.word_count == 0:
+        return 0.0
+    difficult_words = 100 * stats.difficult_word_count(0) / stats.word_count
+    score = 0.1579 * difficult_words + 0.0496 * stats.words_per_sentence
+    if difficult_words > 5:
+        score += 3.6365
+    return score
+
+
+def difficult_words(stats: _ReadabilityStats) -> int:
+    # the number of distinct difficult words, as textstat.difficult_words reports it
+    return len(set(word for word, easy, syllables in zip(stats.words, stats.easy, stats.syllables)
+                   if not easy and syllables >= 2))
+
+
+def linsear_write_formula(stats: _ReadabilityStats) -> float:
+    tokens = stats.text.split()
+    if len(tokens) > 100:
+        # only the first 100 words are scored
+        words = []
+        n_tokens = 0
+        while n_tokens < len(tokens) and len(words) < 100:
+            word = _list_words(tokens[n_tokens])
+            n_tokens += 1
+            if word:
+                words.append(word[0])
+        syllables = [syllable_count(word.lower()) for word in words]
+        sentence_count = _count_sentences(' '.join(tokens[:n_tokens]))
+    else:
+        syllables = stats.syllables
+        sentence_count = _count_sentences(' '.join(tokens))
+
+    if sentence_count == 0:
+        return 0.0
+
+    easy_words = sum(1 for n in syllables if 0 < n < 3)
+    difficult = sum(1 for n in syllables if n >= 3)
+    number = float((easy_words + difficult * 3) / sentence_count)
+    if number <= 20:
+        number -= 2
+    return number / 2
+
+
+def gunning_fog(stats: _ReadabilityStats) -> float:
+    if stats.word_count == 0:
+        return 0.0
+    return 0.4 * (stats.words_per_sentence + 100 * stats.difficult_word_count(3) / stats.word_count)
+
+
+def _flesch_reading_ease_grades(score: float):
+    if 90 <= score < 100:
+        return [5]
+    elif 80 <= score < 90:
+        return [6]
+    elif 70 <= score < 80:
+        return [7]
+    elif 60 <= score < 70:
+        return [8, 9]
+    elif 50 <= score < 60:
+        return [10]
+    elif 40 <= score < 50:
+        return [11]
+    elif 30 <= score < 40:
+        return [12]
+    else:
+        return [13]
+
+
+def text_standard(stats: _ReadabilityStats, scores: Dict = None) -> float:
+    '''
+    The consensus grade level of the other scores. Scores already computed for the text can be passed in scores.
+    '''
+    scores = scores or {}
+
+    def score(function):
+        return scores[function.__name__] if function.__name__ in scores else function(stats)
+
+    grades = []
+    for function in (flesch_kincaid_grade, flesch_reading_ease, smog_index, coleman_liau_index,
+                     automated_readability_index, dale_chall_readability_score, linsear_write_formula, gunning_fog):
+        value = score(function)
+        if function is flesch_reading_ease:
+            grades.extend(_flesch_reading_ease_grades(value))
+        else:
+            grades.extend([math.floor(value), math.ceil(value), round(value)])
+
+    grade = float(Counter(grades).most_common(1)[0][0])
+    return max(1.0, min(grade, 18.0))
+
+
+_SCORE_FUNCTIONS = {
+    'flesch_reading_ease': flesch_reading_ease,
+    'smog_index': smog_index,
+    'flesch_kincaid_grade': flesch_kincaid_grade,
+    'coleman_liau_index': coleman_liau_index,
+    'automated_readability_index': automated_readability_index,
+    'dale_chall_readability_score': dale_chall_readability_score,
+    'difficult_words': difficult_words,
+    'linsear_write_formula': linsear_write_formula,
+    'gunning_fog': gunning_fog,
+}
+
+
+def readability_scores(text: Text, scores=None) -> Dict:
+    '''
+    Computes the readability scores named in scores (all of READABILITY_SCORES if None) for a text, from a single
+    segmentation of it.
+    '''
+    stats = _ReadabilityStats(text)
+    output = {}
+    for name in READABILITY_SCORES:
+        if scores is None or name in scores:
+            if name == 'text_standard':
+                output[name] = text_standard(stats, output)
+            else:
+                output[name] = _SCORE_FUNCTIONS[name](stats)
+
+    return output
@@ -1,11 +1,65 @@
 # -*- coding: utf-8 -*-
 import string
+from functools import lru_cache
 from typing import Text
 from bs4 import BeautifulSoup
-from nltk.corpus import stopwords
 from sklearn.base import BaseEstimator, TransformerMixin
 import unicodedata
 from textwrangler import TextNormalizer
+from .markup import strip_html
+from .stop_words import get_stop_words
+from .utils import _fuse_steps, _run_steps, _scatter, _unique
+from .patterns import (
+    DIGIT_TRANSLATION_TABLE,
+    PUNCTUATION_TRANSLATION_TABLE
+)
+
+
+@lru_cache(maxsize=32)
+def _build_punctuation_table(punctuation_characters, keep_apostrophes):
+    if punctuation_characters is None and keep_apostrophes == False:
+        return PUNCTUATION_TRANSLATION_TABLE
+
+    characters = set(string.punctuation if punctuation_characters is None else punctuation_characters)
+    if keep_apostrophes == True:
+        characters -= {"'", "’"}
+
+    return str.maketrans({x: ' ' for x in characters})
+
+
+# blocks of combining diacritical marks that apply to any script
+_DIACRITIC_RANGES = ((0x0300, 0x036F), (0x1AB0, 0x1AFF), (0x1DC0, 0x1DFF), (0x20D0, 0x20FF), (0xFE20, 0xFE2F))
+
+
+def _is_diacritic(char: Text) -> bool:
+    return any(start <= ord(char) <= end for start, end in _DIACRITIC_RANGES)
+
+
+class _AccentFoldingTable(dict):
+    '''
+    A str.translate table mapping each code point to the ASCII characters of its NFD decomposition, which drops its
+    accents, resolved the first time the code point is seen. Code points with no ASCII decomposition are deleted, or,
+    if keep_non_latin is True, replaced by their decomposition without its combining diacritical marks (recomposed),
+    so 'й' and its decomposed form 'и' + U+0306 both become 'и', while marks such as the kana voicing mark are kept.
+    '''
+
+    def __init__(self, keep_non_latin=False):
+        super().__init__()
+        self.keep_non_latin = keep_non_latin
+
+    def __missing__(self, key):
+        decomposition = unicodedata.normalize('NFD', chr(key))
+        value = decomposition.encode('ascii', 'ignore').decode('ascii')
+        if not value and self.keep_non_latin == True:
+            value = unicodedata.normalize('NFC', ''.join(char for char in decomposition if not _is_diacritic(char)))
+        self[key] = value
+        return value
+
+
+@lru_cache(maxsize=2)
+def _accent_folding_table(keep_non_latin):
+    return _AccentFoldingTable(keep_non_latin)
+
 
 class TextRemover(TextNormalizer, BaseEstimator, TransformerMixin):
     '''
@@ -13,10 +67,29 @@ class TextRemover(TextNormalizer, BaseEstimator, TransformerMixin):
     ----------
 
     accents : default: False
-        If True, removes all accents from characters. For example, 'Café' -> 'Cafe'.
+        If True, removes all accents from characters. For example, 'Café' -> 'Cafe'. See also keep_non_latin.
+
+    dedupe : default: False
+        If True, transform cleans each distinct string of a batch once and copies the result to its duplicates.
+
+    extra_stop_words : default: None
+        A list of words to remove in addition to those of stop_word_languages when stop_words is True.
+
+    keep_apostrophes : default: False
+        If True, apostrophes are kept when punctuation is removed, so "don't" stays as one token.
+
+    keep_non_latin : default: False
+        If True, characters that have no ASCII form, such as those of non-Latin scripts, are kept when accents are
+        removed. Otherwise they are deleted along with the accents.
 
     html : default: False
-        If True, strips HTML tags from the text using BeautifulSoup.
+        If True, strips HTML tags, comments and the content of script and style elements from the text, and decodes
+        character references.
+
+    html_backend : default: 'fast'
+        How HTML is stripped when html is True. If 'fast', the text is streamed through html.parser without building
+        a tree, and strings with no tags are only unescaped. If 'beautifulsoup', each string is parsed into a
+        BeautifulSoup tree and its get_text() is returned. The two agree except on some malformed markup.
 
     numbers : default: False
         If True, removes all numerical characters from the string.
@@ -24,59 +97,102 @@ class TextRemover(TextNormalizer, BaseEstimator, TransformerMixin):
     punctuation : default: True
         If True, removes all punctuation characters from the string.
 
+    punctuation_characters : default: None
+        The characters removed when punctuation is True. If None, the ASCII punctuation characters in
+        string.punctuation are removed.
+
     stop_words : default: False
         If True, removes all stop words from the string.
+
+    stop_word_languages : default: 'english'
+        The NLTK stop word list, or a list of them, used when stop_words is True.
     '''
 
-    def __init__(self, accents=False, html=False, numbers=False, punctuation=True, stop_words=False):
+    def __init__(self, accents=False, dedupe=False, extra_stop_words=None, html=False, html_backend='fast',
+                 keep_apostrophes=False, keep_non_latin=False, numbers=False, punctuation=True,
+                 punctuation_characters=None, stop_words=False, stop_word_languages='english'):
         self.punctuation = punctuation
+        self.punctuation_characters = punctuation_characters
+        self.keep_apostrophes = keep_apostrophes
+        self.keep_non_latin = keep_non_latin
         self.accents = accents
+        self.dedupe = dedupe
         self.numbers = numbers
         self.html = html
+        self.html_backend = html_backend
         self.stop_words = stop_words
+        self.stop_word_languages = stop_word_languages
+        self.extra_stop_words = extra_stop_words
+
+    def _punctuation_table(self):
+        punctuation_characters = self.punctuation_characters
+        if punctuation_characters is not None:
+            punctuation_characters = ''.join(sorted(set(punctuation_characters)))
+
+        return _build_punctuation_table(punctuation_characters, self.keep_apostrophes)
 
     def _punctuation(self, text: Text) -> Text:
-        return text.translate(str.maketrans({a: ' ' for a in string.punctuation}))
+        return text.translate(self._punctuation_table())
+
+    def _accents(self, text: Text, keep_non_latin=False) -> Text:
+        if text.isascii():
+            return text
+        if keep_non_latin == True:
+            return text.translate(_accent_folding_table(True))
 
-    def _accents(self, text: Text) -> Text:
-        return unicodedata.normalize('NFD', text).encode('ascii', 'ignore').decode("utf-8")
+        # equivalent to translating with _accent_folding_table(False), and faster on its own; the table is for fusing
+        # accent removal with other translation steps
+        return unicodedata.normalize('NFD', text).encode('ascii', 'ignore').decode('ascii')
 
     def _numbers(self, text: Text) -> Text:
-        return text.translate({ord(k): None for k in string.digits})
+        return text.translate(DIGIT_TRANSLATION_TABLE)
 
     def _html(self, text: Text) -> Text:
+        return strip_html(text)
+
+    def _html_exact(self, text: Text) -> Text:
         return BeautifulSoup(text, "html.parser").get_text()
 
     def _stop_words(self, text: Text) -> Text:
-        return ' '.join(token for token in text.split() if token not in stopwords.words('english'))
+        stop_words = get_stop_words(self.stop_word_languages, self.extra_stop_words)
+        return ' '.join(token for token in text.split() if token not in stop_words)
 
-    def fit(self, X, y=None):
-        return self
+    def _compile_steps(self):
+        # markup is stripped first so that its tags are still intact, and the character-level steps (accents,
+        # numbers, punctuation) come before stop words, which are matched on whole tokens. Consecutive translation
+        # tables are fused into a single str.translate pass by _fuse_steps.
+        steps = []
+        if self.html == True:
+            if self.html_backend not in ('fast', 'beautifulsoup'):
+                raise ValueError(f"html_backend must be 'fast' or 'beautifulsoup', got {self.html_backend!r}")
+            steps.append(('call', self._html if self.html_backend == 'fast' else self._html_exact))
 
-    def transform(self, text, y=None):
+        if self.accents == True:
+            steps.append(('translate', _accent_folding_table(self.keep_non_latin)))
 
-        output = []
-        if type(text) == str:
-            text = [text]
+        if self.numbers == True:
+            steps.append(('translate', DIGIT_TRANSLATION_TABLE))
 
-        for item in text:
+        if self.punctuation == True:
+            steps.append(('translate', self._punctuation_table()))
 
-            if self.punctuation == True:
-                item = self._punctuation(item)
+        if self.stop_words == True:
+            steps.append(('call', self._stop_words))
 
-            if self.accents == True:
-                item = self._accents(item)
+        steps.append(('call', self._normalize_whitespace))
+        return steps
 
-            if self.numbers == True:
-                item = self._numbers(item)
-
-            if self.html == True:
-                item = self._html(item)
+    def fit(self, X, y=None):
+        return self
 
-            if self.stop_words == True:
-                item = self._stop_words(item)
+    def transform(self, text, y=None):
+        if type(text) == str:
+            text = [text]
 
-            item = self._normalize_whitespace(item)
-            output.append(item)
+        inverse = None
+        if self.dedupe == True:
+            text, inverse = _unique(text)
 
-        return output
\ No newline at end of file
+        steps = _fuse_steps(self._compile_steps())
+        output = [_run_steps(item, steps) for item in text]
+        return output if inverse is None else _scatter(output, inverse)
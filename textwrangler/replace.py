@@ -1,23 +1,53 @@
 # -*- coding: utf-8 -*-
+from functools import lru_cache, partial
 from typing import Text
 import contractions
 import inflect
-import nltk
 from sklearn.base import BaseEstimator, TransformerMixin
-from .patterns import (
-    RE_CURRENCY_SYMBOL,
-    RE_EMAIL,
-    RE_NUMBER,
-    RE_HASHTAG,
-    RE_PHONE_NUMBER,
-    RE_URL,
-    RE_SHORT_URL,
-    RE_USER_HANDLE
+from .patterns import RE_DIGIT_TOKEN, find_entity_pattern
+from .utils import _StreamingMixin, _fuse_steps, _run_steps, _scatter, _unique
+
+_inflect_engine = None
+
+# the entities each parameter replaces
+_ENTITY_PARAMETERS = (
+    ('currency_symbols', ('currency_symbol',)),
+    ('emails', ('email',)),
+    ('numbers', ('number',)),
+    ('hashtags', ('hashtag',)),
+    ('phone_numbers', ('phone_number',)),
+    ('urls', ('url', 'short_url')),
+    ('user_handles', ('user_handle',)),
 )
 
+_ENTITY_PLACEHOLDERS = {
+    'currency_symbol': '_CUR_',
+    'email': '_EMAIL_',
+    'number': '_NUMBER_',
+    'hashtag': '_TAG_',
+    'phone_number': '_PHONE_',
+    'url': '_URL_',
+    'short_url': '_URL_',
+    'user_handle': '_USER_',
+}
 
-class TextReplacer(BaseEstimator, TransformerMixin):
+
+@lru_cache(maxsize=4096)
+def _number_to_words(number: Text) -> Text:
+    # the same numbers recur constantly in real text, and the inflect engine is slow to create and to call
+    global _inflect_engine
+    if _inflect_engine is None:
+        _inflect_engine = inflect.engine()
+
+    return _inflect_engine.number_to_words(number)
+
+
+class TextReplacer(_StreamingMixin, BaseEstimator, TransformerMixin):
     '''
+    Replaces entities such as URLs, emails and numbers with placeholders. All the enabled entities are found in a
+    single scan of each string, where the leftmost match wins and ties go to URLs, then emails, phone numbers, user
+    handles, hashtags, currency symbols and numbers, so the numbers inside a URL or phone number are left alone.
+
     Parameters
     ----------
 
@@ -31,6 +61,9 @@ class TextReplacer(BaseEstimator, TransformerMixin):
     currency_symbols : default: False
         If True, currency symbols are replaced with " _CUR_ ".
 
+    dedupe : default: False
+        If True, transform rewrites each distinct string of a batch once and copies the result to its duplicates.
+
     emails : default: False
         If True, email addresses are replaced with " _EMAIL_ ".
 
@@ -45,6 +78,9 @@ class TextReplacer(BaseEstimator, TransformerMixin):
 
         "12" -> "Twelve".
 
+        Only tokens made up entirely of digits, as NLTK's word tokenizer splits them, are replaced, so numbers such as
+        "10:30", "555-1234" or "2020-01-05" are kept. The rest of the string is left untouched.
+
         See https://github.com/jazzband/inflect.
 
     phone_numbers : default: False
@@ -57,11 +93,12 @@ class TextReplacer(BaseEstimator, TransformerMixin):
         If True, Twitter user handles are replaced with " _USER_ ".
     '''
 
-    def __init__(self, contractions=False, currency_symbols=False, emails=False, hashtags=False, numbers=False,
-                 numbers_with_text_repr=False, phone_numbers=False, urls=False, user_handles=False):
+    def __init__(self, contractions=False, currency_symbols=False, dedupe=False, emails=False, hashtags=False,
+                 numbers=False, numbers_with_text_repr=False, phone_numbers=False, urls=False, user_handles=False):
 
         self.contractions = contractions
         self.currency_symbols = currency_symbols
+        self.dedupe = dedupe
         self.emails = emails
         self.numbers = numbers
         self.hashtags = hashtags
@@ -73,69 +110,44 @@ class TextReplacer(BaseEstimator, TransformerMixin):
     def _contractions(self, text: Text) -> Text:
         return contractions.fix(text)
 
-    def _currency_symbols(self, text: Text, replace_with="_CUR_") -> Text:
-        return RE_CURRENCY_SYMBOL.sub(replace_with, text)
+    def _entities(self, text: Text, entities) -> Text:
+        pattern = find_entity_pattern(text, entities)
+        if pattern is None:
+            return text
 
-    def _emails(self, text: Text, replace_with="_EMAIL_") -> Text:
-        return RE_EMAIL.sub(replace_with, text)
+        return pattern.sub(lambda match: _ENTITY_PLACEHOLDERS[match.lastgroup], text)
 
-    def _numbers(self, text: Text, replace_with="_NUMBER_") -> Text:
-        return RE_NUMBER.sub(replace_with, text)
+    def _numbers_with_text_repr(self, text: Text) -> Text:
+        return RE_DIGIT_TOKEN.sub(lambda match: _number_to_words(match.group()), text)
 
-    def _hashtags(self, text: Text, replace_with="_TAG_") -> Text:
-        return RE_HASHTAG.sub(replace_with, text)
+    def _compile_steps(self):
+        steps = []
+        if self.contractions == True:
+            steps.append(('call', self._contractions))
 
-    def _phone_numbers(self, text: Text, replace_with="_PHONE_") -> Text:
-        return RE_PHONE_NUMBER.sub(replace_with, text)
+        # all the enabled entities are replaced in a single scan of the patterns that pass their prefilters; see
+        # compile_entity_pattern for how overlapping matches are resolved
+        entities = tuple(entity for parameter, names in _ENTITY_PARAMETERS if getattr(self, parameter) == True
+                         for entity in names)
+        if entities:
+            steps.append(('call', partial(self._entities, entities=entities)))
 
-    def _urls(self, text: Text, replace_with="_URL_") -> Text:
-        return RE_URL.sub(replace_with, RE_SHORT_URL.sub(replace_with, text))
+        if self.numbers_with_text_repr == True:
+            steps.append(('call', self._numbers_with_text_repr))
 
-    def _user_handles(self, text: Text, replace_with="_USER_") -> Text:
-        return RE_USER_HANDLE.sub(replace_with, text)
-
-    def _numbers_with_text_repr(self, text: Text) -> Text:
-        p = inflect.engine()
-        return ' '.join([(p.number_to_words(token) if token.isdigit() else token) for token in nltk.word_tokenize(text)])
+        return steps
 
     def fit(self, X, y=None):
         return self
 
     def transform(self, text, y=None):
-
-        output = []
         if type(text) == str:
             text = [text]
 
-        for item in text:
-
-            if self.contractions == True:
-                item = self._contractions(item)
-
-            if self.currency_symbols == True:
-                item = self._currency_symbols(item)
-
-            if self.emails == True:
-                item = self._emails(item)
-
-            if self.numbers == True:
-                item = self._numbers(item)
-
-            if self.hashtags == True:
-                item = self._hashtags(item)
-
-            if self.phone_numbers == True:
-                item = self._phone_numbers(item)
-
-            if self.urls == True:
-                item = self._urls(item)
-
-            if self.user_handles == True:
-                item = self._user_handles(item)
-
-            if self.numbers_with_text_repr == True:
-                item = self._numbers_with_text_repr(item)
-
-            output.append(item)
+        inverse = None
+        if self.dedupe == True:
+            text, inverse = _unique(text)
 
-        return output
\ No newline at end of file
+        steps = _fuse_steps(self._compile_steps())
+        output = [_run_steps(item, steps) for item in text]
+        return output if inverse is None else _scatter(output, inverse)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from textblob.en import sentiment as pattern_sentiment
+from .patterns import RE_WORD
+
+_lexicon = None
+
+
+def _get_lexicon():
+    '''
+    Builds, once per process, a word -> row index and (polarity, subjectivity) arrays from the lexicon behind
+    TextBlob's default PatternAnalyzer.
+    '''
+    global _lexicon
+    if _lexicon is None:
+        pattern_sentiment.load()
+        words = sorted(word for word in pattern_sentiment if word)
+        scores = np.array([pattern_sentiment[word][None][:2] for word in words], dtype=np.float64).reshape(-1, 2)
+        _lexicon = ({word: i for i, word in enumerate(words)}, scores[:, 0], scores[:, 1])
+
+    return _lexicon
+
+
+def lexicon_sentiment(texts):
+    '''
+    Scores a batch of strings as the mean polarity and subjectivity of their words found in the TextBlob sentiment
+    lexicon. Unlike TextBlob's analyzer, no negation, intensifier or part-of-speech rules are applied, which makes it
+    much faster but less accurate. Strings with no lexicon words score 0.0 for both.
+
+    Returns a (polarity, subjectivity) tuple of arrays with a value for each string.
+    '''
+    index, polarity, subjectivity = _get_lexicon()
+    documents, words = [], []
+    for i, text in enumerate(texts):
+        for word in RE_WORD.findall(text.lower()):
+            j = index.get(word)
+            if j is not None:
+                documents.append(i)
+                words.append(j)
+
+    n = len(texts)
+    documents = np.asarray(documents, dtype=np.int64)
+    words = np.asarray(words, dtype=np.int64)
+    counts = np.maximum(np.bincount(documents, minlength=n), 1)
+    return (np.bincount(documents, weights=polarity[words], minlength=n) / counts,
+            np.bincount(documents, weights=subjectivity[words], minlength=n) / counts)
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from functools import lru_cache
+from nltk.corpus import stopwords
+
+
+@lru_cache(maxsize=None)
+def _load_stop_words(language):
+    return frozenset(stopwords.words(language))
+
+
+@lru_cache(maxsize=32)
+def _combine_stop_words(languages, extra_stop_words):
+    return frozenset().union(*(_load_stop_words(language) for language in languages), extra_stop_words)
+
+
+def get_stop_words(languages='english', extra_stop_words=None) -> frozenset:
+    '''
+    Returns the NLTK stop words for one or more languages as a frozen set, optionally with extra words added.
+
+    Each language's list is read from the NLTK corpus the first time it is requested, and the combined set for each
+    combination of arguments is cached, so repeated calls cost a dictionary lookup.
+
+    Parameters
+    ----------
+
+    languages : default: 'english'
+        The name of an NLTK stop word list, or a list of names.
+
+    extra_stop_words : default: None
+        An iterable of additional words to treat as stop words.
+    '''
+    if isinstance(languages, str):
+        languages = (languages,)
+
+    return _combine_stop_words(tuple(languages), tuple(extra_stop_words or ()))
@@ -1,27 +1,190 @@
 # -*- coding: utf-8 -*-
 from textwrangler.normalize import TextNormalizer
 from textwrangler.remove import TextRemover
+from textwrangler.patterns import PUNCTUATION_TRANSLATION_TABLE
+import json
+import zlib
+from hashlib import blake2b
 from collections import Counter
+import numpy as np
 from sklearn.base import BaseEstimator, TransformerMixin
 
+# the number of shingles hashed at a time, which bounds the hash matrix to num_permutations * 8 bytes per shingle
+_MINHASH_BLOCK_SIZE = 50000
+
+
+def _seen_before(counts, item, other) -> bool:
+    # whether item was added to counts before other; a Counter keeps its keys in insertion order, which is also the
+    # order most_common breaks ties in
+    for key in counts:
+        if key == item:
+            return True
+        if key == other:
+            return False
+    return False
+
+
+def _shingles(text, n):
+    # the set of character n-grams of a string; a string shorter than n is its own single shingle
+    if len(text) < n:
+        return frozenset([text]) if text else frozenset()
+    return frozenset(text[i:i + n] for i in range(len(text) - n + 1))
+
+
+def _minhash_signatures(shingle_sets, num_permutations, random_state):
+    '''
+    Returns a (len(shingle_sets), num_permutations) uint32 array of MinHash signatures: for each of num_permutations
+    random multiply-shift hash functions ((a * x + b) mod 2 ** 64) >> 32 of the CRC-32 of the shingles, the minimum
+    over each set. The sets must be non-empty.
+    '''
+    rng = np.random.RandomState(random_state)
+    a = rng.randint(0, 2 ** 64, size=(num_permutations, 1), dtype=np.uint64)
+    b = rng.randint(0, 2 ** 64, size=(num_permutations, 1), dtype=np.uint64)
+
+    # the same shingles recur across many strings, so each distinct one is only hashed once
+    vocabulary = {}
+    ids = np.fromiter((vocabulary.setdefault(shingle, len(vocabulary))
+                       for shingles in shingle_sets for shingle in shingles), dtype=np.int64)
+    crcs = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in vocabulary), dtype=np.uint64,
+                       count=len(vocabulary))
+
+    lengths = np.fromiter((len(shingles) for shingles in shingle_sets), dtype=np.int64, count=len(shingle_sets))
+    ends = np.cumsum(lengths)
+    signatures = np.empty((len(shingle_sets), num_permutations), dtype=np.uint32)
+    start = 0
+    while start < len(shingle_sets):
+        stop = max(start + 1, int(np.searchsorted(ends, ends[start] - lengths[start] + _MINHASH_BLOCK_SIZE, 'right')))
+        hashes = crcs[ids[ends[start] - lengths[start]:ends[stop - 1]]]
+        offsets = np.concatenate(([0], np.cumsum(lengths[start:stop])[:-1]))
+        values = (a * hashes + b) >> np.uint64(32)
+        signatures[start:stop] = np.minimum.reduceat(values, offsets, axis=1).T
+        start = stop
+
+    return signatures
+
+
+def _choose_bands(threshold, num_permutations):
+    # b bands of r rows make pairs with a Jaccard similarity above roughly (1 / b) ** (1 / r) candidates. Candidates
+    # are verified exactly, so take the split whose estimate is the highest one at or below the threshold, trading
+    # extra candidates for fewer missed pairs.
+    splits = [b for b in range(1, num_permutations + 1) if num_permutations % b == 0]
+    estimates = {b: (1 / b) ** (b / num_permutations) for b in splits}
+    below = [b for b in splits if estimates[b] <= threshold]
+    return max(below, key=estimates.get) if below else num_permutations
+
+
+def _near_duplicate_clusters(shingle_sets, threshold, num_permutations, num_bands, random_state):
+    '''
+    Clusters distinct shingle sets whose Jaccard similarity is at least threshold, returning a cluster label for each.
+    Candidate pairs are the sets that share a band of their MinHash signatures (locality-sensitive hashing); each is
+    checked with the exact Jaccard similarity and joined with union-find, so clusters are the connected components
+    of the similar pairs. Empty sets form a single cluster.
+    '''
+    parent = list(range(len(shingle_sets)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    nonempty = [i for i, shingles in enumerate(shingle_sets) if shingles]
+    empty = [i for i, shingles in enumerate(shingle_sets) if not shingles]
+    for i in empty[1:]:
+        parent[i] = empty[0]
+
+    if len(nonempty) > 1:
+        if num_bands is None:
+            num_bands = _choose_bands(threshold, num_permutations)
+        rows = num_permutations // num_bands
+        signatures = _minhash_signatures([shingle_sets[i] for i in nonempty], num_permutations, random_state)
+
+        for band in range(num_bands):
+            keys = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+            _, buckets = np.unique(keys.view(np.dtype((np.void, rows * 4))).ravel(), return_inverse=True)
+            buckets = buckets.ravel()
+
+            # only the buckets holding more than one set give candidate pairs
+            shared = np.bincount(buckets)[buckets] > 1
+            members = np.flatnonzero(shared)
+            members = members[np.argsort(buckets[members], kind='stable')]
+            boundaries = np.flatnonzero(np.diff(buckets[members])) + 1
+            for bucket in np.split(members, boundaries):
+                # the bucket's members grouped by component; each new member is compared with the members of the
+                # other components until it matches one of them, and is then joined to that component
+                components = {}
+                for j in (nonempty[k] for k in bucket):
+                    root_j = find(j)
+                    joined = components.pop(root_j, [])
+                    for root in list(components):
+                        for i in components[root]:
+                            intersection = len(shingle_sets[i] & shingle_sets[j])
+                            union = len(shingle_sets[i]) + len(shingle_sets[j]) - intersection
+                            if intersection >= threshold * union:
+                                parent[root] = root_j
+                                joined.extend(components.pop(root))
+                                break
+                    joined.append(j)
+                    components[root_j] = joined
+
+    return [find(i) for i in range(len(shingle_sets))]
+
+
 # Adapted from https://gist.github.com/cjdd3b/0386f139bb953f046c6e.
 class FingerPrintTransformer(TextRemover, TextNormalizer, BaseEstimator, TransformerMixin):
     '''
     Parameters
     ----------
 
+    fingerprint_bits : default: None
+        If None, fingerprints are strings. If a multiple of 8 up to 512, such as 64 or 128, each fingerprint is
+        replaced by an int of that many bits, the BLAKE2b hash of the fingerprint string, so grouping and the
+        fingerprint index hold a fixed-size key per cluster rather than an n-gram fingerprint n times the length
+        of its string.
+
+    jaccard_threshold : default: None
+        If None, strings are clustered when their fingerprints are equal.
+        If a float between 0 and 1, strings are clustered as near-duplicates: when the Jaccard similarity of the sets
+        of their character n-grams (of size n_gram, or 3 if n_gram is None) is at least jaccard_threshold, or when
+        they are linked by a chain of such strings. Candidate pairs are found with MinHash signatures and
+        locality-sensitive hashing rather than by comparing every pair, so a few similar pairs may be missed. The
+        canonical string of each cluster is its most common string. Near-duplicate clusters are found within each
+        call to transform, without an index, so fit does nothing and partial_fit raises a ValueError.
+
     n_gram : default: None
         If None, the standard fingerprint clustering method is applied.
         If an int is supplied, n-gram fingerprint clustering is applied.
 
+    num_bands : default: None
+        The number of LSH bands the MinHash signatures are split into when jaccard_threshold is set; it must divide
+        num_permutations. If None, it is chosen from jaccard_threshold, favouring recall.
+
+    num_permutations : default: 128
+        The length of the MinHash signatures when jaccard_threshold is set. Longer signatures find similar pairs more
+        reliably, at a higher cost.
+
+    random_state : default: 0
+        The seed of the MinHash hash functions.
+
     return_fingerprints : default: False
         If False, cleaned strings are returned based on the most common string in each fingerprint cluster.
         If True, the actual fingerprints are returned.
+
+    Without fitting, transform clusters the strings of each call on their own (and transform_iter those of each batch
+    it reads). fit and partial_fit build an index of fingerprint -> most common string over all the strings they
+    see, which can be extended batch by batch and saved with save_index, and transform then looks each string's
+    fingerprint up in it.
     '''
 
-    def __init__(self, n_gram=None, return_fingerprints=False):
+    def __init__(self, fingerprint_bits=None, jaccard_threshold=None, n_gram=None, num_bands=None, num_permutations=128,
+                 random_state=0, return_fingerprints=False):
 
+        self.fingerprint_bits = fingerprint_bits
+        self.jaccard_threshold = jaccard_threshold
         self.n_gram = n_gram
+        self.num_bands = num_bands
+        self.num_permutations = num_permutations
+        self.random_state = random_state
         self.return_fingerprints = return_fingerprints
 
     def __unique_preserving_order(self, seq):
@@ -31,9 +194,50 @@ class FingerPrintTransformer(TextRemover, TextNormalizer, BaseEstimator, Transfo
         return self._accents(' '.join(self.__unique_preserving_order(sorted(text.split()))))
 
     def __get_ngram_fingerprint(self, text, n):
-        return self._accents(''.join(self.__unique_preserving_order(sorted([text[i:i + n] for i in range(len(text) - n + 1)]))).strip())
+        # accents are folded once on the string rather than on its n-gram fingerprint, which is n times longer, and
+        # only the distinct n-grams are sorted
+        text = self._accents(text)
+        return ''.join(sorted({text[i:i + n] for i in range(len(text) - n + 1)})).strip()
+
+    def __hash_fingerprint(self, fingerprint):
+        digest = blake2b(fingerprint.encode('utf-8'), digest_size=self.fingerprint_bits // 8).digest()
+        return int.from_bytes(digest, 'big')
+
+    def __prepare(self, item):
+        item = item.strip()  # remove trailing whitespace
+        item = self._normalize_case(item)  # lowercase string
+        item = self._normalize_unicode(item)
+        item = self._normalize_quotation_marks(item)
+        return item.translate(PUNCTUATION_TRANSLATION_TABLE)  # remove punctuation
+
+    def __cluster_near_duplicates(self, text):
+        if type(text) == str:
+            text = [text]
+
+        if self.num_bands is not None and self.num_permutations % self.num_bands != 0:
+            raise ValueError(f"num_bands must divide num_permutations, got {self.num_bands} and "
+                             f"{self.num_permutations}")
+
+        # strings with the same n-gram set are identical as far as the clustering is concerned, so each distinct set
+        # is only hashed and compared once
+        n = 3 if self.n_gram is None else self.n_gram
+        shingle_sets = {}
+        ids = [shingle_sets.setdefault(_shingles(self._accents(self.__prepare(item)), n), len(shingle_sets))
+               for item in text]
+        labels = _near_duplicate_clusters(list(shingle_sets), self.jaccard_threshold, self.num_permutations,
+                                          self.num_bands, self.random_state)
+
+        counts = {}
+        for item, i in zip(text, ids):
+            counts.setdefault(labels[i], Counter())[item] += 1
+        canonical = {label: counter.most_common(1)[0][0] for label, counter in counts.items()}
+
+        return [canonical[labels[i]] for i in ids]
 
     def __get_fingerprints(self, text):
+        if self.fingerprint_bits is not None and self.fingerprint_bits not in range(8, 513, 8):
+            raise ValueError(f"fingerprint_bits must be a multiple of 8 up to 512, got {self.fingerprint_bits!r}")
+
         if type(text) == str:
             output_text = [text]
         else:
@@ -41,42 +245,99 @@ class FingerPrintTransformer(TextRemover, TextNormalizer, BaseEstimator, Transfo
 
         output = []
         for item in output_text:
-            item = item.strip()  # remove trailing whitespace
-            item = self._normalize_case(item)  # lowercase string
-            item = self._normalize_unicode(item)
-            item = self._normalize_quotation_marks(item)
-            item = self._punctuation(item)  # remove punctuation
+            item = self.__prepare(item)
             if self.n_gram == None:
                 item = self.__get_fingerprint(item)
             else:
                 item = self.__get_ngram_fingerprint(item, self.n_gram)
+            if self.fingerprint_bits is not None:
+                item = self.__hash_fingerprint(item)
             output.append(item)
 
         return output
 
+    def _compile_steps(self):
+        # fingerprint clustering needs the whole batch, so it can't be fused into a TextPipeline's per-document steps
+        return None
+
+    def partial_fit(self, text, y=None):
+        '''
+        Adds the strings to the fingerprint index. Each fingerprint keeps a count of the strings that produced it, and
+        its canonical string is the most common of them, with ties going to the string seen first, as when transform
+        clusters strings without an index.
+        '''
+        if self.jaccard_threshold is not None:
+            raise ValueError("the fingerprint index needs exact fingerprints, so partial_fit can't be used with "
+                             "jaccard_threshold")
+
+        if type(text) == str:
+            text = [text]
+
+        if not hasattr(self, 'index_'):
+            self.index_ = {}
+
+        for item, fingerprint in zip(text, self.__get_fingerprints(text)):
+            entry = self.index_.get(fingerprint)
+            if entry is None:
+                entry = self.index_[fingerprint] = [item, Counter()]
+
+            counts = entry[1]
+            counts[item] += 1
+            if counts[item] > counts[entry[0]] or (counts[item] == counts[entry[0]] and
+                                                   _seen_before(counts, item, entry[0])):
+                entry[0] = item
+
+        return self
+
     def fit(self, text, y=None):
+        '''Builds the fingerprint index from the strings, discarding any previous index.'''
+        if self.jaccard_threshold is not None:
+            return self
+
+        self.index_ = {}
+        return self.partial_fit(text)
+
+    def save_index(self, path):
+        '''Writes the fingerprint index to a JSON file.'''
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump([[fingerprint, canonical, list(counts.items())]
+                       for fingerprint, (canonical, counts) in self.index_.items()], f, ensure_ascii=False)
+
+    def load_index(self, path):
+        '''Replaces the fingerprint index with one written by save_index.'''
+        with open(path, encoding='utf-8') as f:
+            self.index_ = {fingerprint: [canonical, Counter(dict(counts))]
+                           for fingerprint, canonical, counts in json.load(f)}
         return self
 
     def transform(self, text, y=None):
         if self.return_fingerprints == True:
             return self.__get_fingerprints(text)
+        elif self.jaccard_threshold is not None:
+            return self.__cluster_near_duplicates(text)
+        elif hasattr(self, 'index_'):
+            # strings whose fingerprint isn't in the index are returned unchanged
+            if type(text) == str:
+                text = [text]
+
+            index = self.index_
+            return [index[fingerprint][0] if fingerprint in index else item
+                    for item, fingerprint in zip(text, self.__get_fingerprints(text))]
         else:
-            fingerprint_tuples = list(zip(text, self.__get_fingerprints(text)))
+            if type(text) == str:
+                text = [text]
+            fingerprints = self.__get_fingerprints(text)
 
-            # group original text into fingerprints
-            fingerprint_groups = {}
-            for tup in fingerprint_tuples:
-                if tup[1] in fingerprint_groups.keys():
-                    fingerprint_groups[tup[1]].append(tup[0])
-                else:
-                    fingerprint_groups[tup[1]] = [tup[0]]
+            # count the original strings of each fingerprint
+            fingerprint_counts = {}
+            for item, fingerprint in zip(text, fingerprints):
+                fingerprint_counts.setdefault(fingerprint, Counter())[item] += 1
 
             # get the most common original string for each fingerprint
-            fingerprint_most_common = {}
-            for key in fingerprint_groups.keys():
-                fingerprint_most_common[key] = Counter(fingerprint_groups[key]).most_common(1)[0][0]
+            fingerprint_most_common = {fingerprint: counts.most_common(1)[0][0]
+                                       for fingerprint, counts in fingerprint_counts.items()}
 
             # transform the original strings into the most common string for each fingerprint group
-            return [fingerprint_most_common[tup[1]] for tup in fingerprint_tuples]
+            return [fingerprint_most_common[fingerprint] for fingerprint in fingerprints]
 
 
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import json
+from collections import OrderedDict
+from itertools import islice
+from typing import Text
+import numpy as np
+
+
+class _TranslationChain(dict):
+    '''
+    A str.translate table equivalent to applying several tables one after the other. Each code point is resolved
+    through the tables the first time it is seen and cached, so later lookups are plain dictionary hits.
+    '''
+
+    def __init__(self, tables):
+        super().__init__()
+        self.tables = tables
+
+    def __missing__(self, key):
+        value = chr(key)
+        for table in self.tables:
+            value = value.translate(table)
+        self[key] = value
+        return value
+
+
+def _fuse_steps(steps):
+    '''
+    Merges each run of consecutive ('translate', table) steps into a single translate table, so the run costs one
+    pass over the string instead of one per table.
+
+    A step is either ('translate', table) or ('call', function), where function maps a string to a string.
+    '''
+    fused = []
+    for kind, value in steps:
+        if kind == 'translate' and fused and fused[-1][0] == 'translate':
+            previous = fused[-1][1]
+            tables = previous.tables if isinstance(previous, _TranslationChain) else [previous]
+            fused[-1] = ('translate', _TranslationChain(tables + [value]))
+        else:
+            fused.append((kind, value))
+
+    return fused
+
+
+def _run_steps(text: Text, steps) -> Text:
+    for kind, value in steps:
+        if kind == 'translate':
+            text = text.translate(value)
+        else:
+            text = value(text)
+
+    return text
+
+
+class _LRUCache(object):
+    '''
+    A size-bounded mapping that evicts the least recently used entry once it holds more than maxsize entries.
+    The entries can be saved to and loaded from a JSON file, so a warm cache survives between runs.
+    '''
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        try:
+            self._entries.move_to_end(key)
+        except KeyError:
+            return default
+        return self._entries[key]
+
+    def __setitem__(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if self.maxsize is not None and len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(list(self._entries.items()), f, ensure_ascii=False)
+
+    def load(self, path):
+        with open(path, encoding='utf-8') as f:
+            for key, value in json.load(f):
+                self[key] = value
+
+
+def _unique(items):
+    '''
+    Returns the distinct items of a list, in order of first occurrence, and for each item of the list the position
+    of its value among them. Items are compared by hash and equality, as dictionary keys are.
+    '''
+    positions = {}
+    inverse = [positions.setdefault(item, len(positions)) for item in items]
+    return list(positions), inverse
+
+
+def _scatter(results, inverse):
+    '''
+    Expands the results computed for the distinct items returned by _unique back to one result per item of the
+    original list, in its order. The rows of a NumPy array are indexed with inverse.
+    '''
+    if isinstance(results, np.ndarray):
+        return results[np.asarray(inverse, dtype=np.intp)]
+
+    return [results[i] for i in inverse]
+
+
+def _batches(iterable, batch_size):
+    '''Yields lists of up to batch_size items from any iterable, consuming it lazily.'''
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class _StreamingMixin(object):
+    '''
+    Adds transform_iter to transformers whose transform maps a list of strings to a list of results.
+    '''
+
+    def transform_iter(self, text, batch_size=1000):
+        '''
+        Lazily transforms the strings of any iterable, such as a file of lines, a generator or a database cursor, and
+        yields one result per string. At most batch_size strings are held in memory at a time.
+        '''
+        if type(text) == str:
+            text = [text]
+
+        for batch in _batches(text, batch_size):
+            yield from self.transform(batch)